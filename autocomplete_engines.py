@@ -1,294 +1,1195 @@
-"""CSC148 Assignment 2: Autocomplete engines
-
-=== CSC148 Fall 2018 ===
-Department of Computer Science,
-University of Toronto
-
-=== Module description ===
-This file contains starter code for the three different autocomplete engines
-you are writing for this assignment.
-
-As usual, be sure not to change any parts of the given *public interface* in the
-starter code---and this includes the instance attributes, which we will be
-testing directly! You may, however, add new private attributes, methods, and
-top-level functions to this file.
-"""
-from __future__ import annotations
-import csv
-from typing import Any, Dict, List, Optional, Tuple
-
-from melody import Melody
-from prefix_tree import SimplePrefixTree, CompressedPrefixTree
-
-
-################################################################################
-# Text-based Autocomplete Engines (Task 4)
-################################################################################
-class LetterAutocompleteEngine:
-    """An autocomplete engine that suggests strings based on a few letters.
-
-    The *prefix sequence* for a string is the list of characters in the string.
-    This can include space characters.
-
-    This autocomplete engine only stores and suggests strings with lowercase
-    letters, numbers, and space characters; see the section on
-    "Text sanitization" on the assignment handout.
-
-    === Attributes ===
-    autocompleter: An Autocompleter used by this engine.
-    """
-    autocompleter: Autocompleter
-
-    def __init__(self, config: Dict[str, Any]) -> None:
-        """Initialize this engine with the given configuration.
-
-        <config> is a dictionary consisting of the following keys:
-            - 'file': the path to a text file
-            - 'autocompleter': either the string 'simple' or 'compressed',
-              specifying which subclass of Autocompleter to use.
-            - 'weight_type': either 'sum' or 'average', which specifies the
-              weight type for the prefix tree.
-
-        Each line of the specified file counts as one input string.
-        Note that the line may or may not contain spaces.
-        Each string must be sanitized, and if the resulting string contains
-        at least one alphanumeric character, it is inserted into the
-        Autocompleter.
-
-        *Skip lines that do not contain at least one alphanumeric character!*
-
-        When each string is inserted, it is given a weight of one.
-        Note that it is possible for the same string to appear on more than
-        one line of the input file; this would result in that string getting
-        a larger weight (because of how Autocompleter.insert works).
-        """
-        # We've opened the file for you here. You should iterate over the
-        # lines of the file and process them according to the description in
-        # this method's docstring.
-        with open(config['file'], encoding='utf8') as f:
-            pass
-
-    def autocomplete(self, prefix: str,
-                     limit: Optional[int] = None) -> List[Tuple[str, float]]:
-        """Return up to <limit> matches for the given prefix string.
-
-        The return value is a list of tuples (string, weight), and must be
-        ordered in non-increasing weight. (You can decide how to break ties.)
-
-        If limit is None, return *every* match for the given prefix.
-
-        Note that the given prefix string must be transformed into a list
-        of letters before being passed to the Autocompleter.
-
-        Preconditions:
-            limit is None or limit > 0
-            <prefix> contains only lowercase alphanumeric characters and spaces
-        """
-        pass
-
-    def remove(self, prefix: str) -> None:
-        """Remove all strings that match the given prefix string.
-
-        Note that the given prefix string must be transformed into a list
-        of letters before being passed to the Autocompleter.
-
-        Precondition: <prefix> contains only lowercase alphanumeric characters
-                      and spaces.
-        """
-        pass
-
-
-class SentenceAutocompleteEngine:
-    """An autocomplete engine that suggests strings based on a few words.
-
-    A *word* is a string containing only alphanumeric characters.
-    The *prefix sequence* for a string is the list of words in the string
-    (separated by whitespace). The words themselves do not contain spaces.
-
-    This autocomplete engine only stores and suggests strings with lowercase
-    letters, numbers, and space characters; see the section on
-    "Text sanitization" on the assignment handout.
-
-    === Attributes ===
-    autocompleter: An Autocompleter used by this engine.
-    """
-    autocompleter: Autocompleter
-
-    def __init__(self, config: Dict[str, Any]) -> None:
-        """Initialize this engine with the given configuration.
-
-        <config> is a dictionary consisting of the following keys:
-            - 'file': the path to a CSV file
-            - 'autocompleter': either the string 'simple' or 'compressed',
-              specifying which subclass of Autocompleter to use.
-            - 'weight_type': either 'sum' or 'average', which specifies the
-              weight type for the prefix tree.
-
-        Precondition:
-        The given file is a *CSV file* where each line has two entries:
-            - the first entry is a string
-            - the second entry is the a number representing the weight of that
-              string
-
-        Note that the line may or may not contain spaces.
-        Each string must be sanitized, and if the resulting string contains
-        at least one word, it is inserted into the Autocompleter.
-
-        *Skip lines that do not contain at least one alphanumeric character!*
-
-        When each string is inserted, it is given THE WEIGHT SPECIFIED ON THE
-        LINE FROM THE CSV FILE. (Updated Nov 19)
-        Note that it is possible for the same string to appear on more than
-        one line of the input file; this would result in that string getting
-        a larger weight.
-        """
-        # We haven't given you any starter code here! You should review how
-        # you processed CSV files on Assignment 1.
-        pass
-
-    def autocomplete(self, prefix: str,
-                     limit: Optional[int] = None) -> List[Tuple[str, float]]:
-        """Return up to <limit> matches for the given prefix string.
-
-        The return value is a list of tuples (string, weight), and must be
-        ordered in non-increasing weight. (You can decide how to break ties.)
-
-        If limit is None, return *every* match for the given prefix.
-
-        Note that the given prefix string must be transformed into a list
-        of words before being passed to the Autocompleter.
-
-        Preconditions:
-            limit is None or limit > 0
-            <prefix> contains only lowercase alphanumeric characters and spaces
-        """
-        pass
-
-    def remove(self, prefix: str) -> None:
-        """Remove all strings that match the given prefix.
-
-        Note that the given prefix string must be transformed into a list
-        of words before being passed to the Autocompleter.
-
-        Precondition: <prefix> contains only lowercase alphanumeric characters
-                      and spaces.
-        """
-        pass
-
-
-################################################################################
-# Melody-based Autocomplete Engines (Task 5)
-################################################################################
-class MelodyAutocompleteEngine:
-    """An autocomplete engine that suggests melodies based on a few intervals.
-
-    The values stored are Melody objects, and the corresponding
-    prefix sequence for a Melody is its interval sequence.
-
-    Because the prefix is based only on interval sequence and not the
-    starting pitch or duration of the notes, it is possible for different
-    melodies to have the same prefix.
-
-    # === Private Attributes ===
-    autocompleter: An Autocompleter used by this engine.
-    """
-    autocompleter: Autocompleter
-
-    def __init__(self, config: Dict[str, Any]) -> None:
-        """Initialize this engine with the given configuration.
-
-        <config> is a dictionary consisting of the following keys:
-            - 'file': the path to a CSV file
-            - 'autocompleter': either the string 'simple' or 'compressed',
-              specifying which subclass of Autocompleter to use.
-            - 'weight_type': either 'sum' or 'average', which specifies the
-              weight type for the prefix tree.
-
-        Precondition:
-        The given file is a *CSV file* where each line has the following format:
-            - The first entry is the name of a melody (a string).
-            - The remaining entries are grouped into pairs (as in Assignment 1)
-              where the first number in each pair is a note pitch,
-              and the second number is the corresponding duration.
-
-            HOWEVER, there may be blank entries (stored as an empty string '');
-            as soon as you encounter a blank entry, stop processing this line
-            and move onto the next line the CSV file.
-
-        Each melody is be inserted into the Autocompleter with a weight of 1.
-        """
-        # We haven't given you any starter code here! You should review how
-        # you processed CSV files on Assignment 1.
-        pass
-
-    def autocomplete(self, prefix: List[int],
-                     limit: Optional[int] = None) -> List[Tuple[Melody, float]]:
-        """Return up to <limit> matches for the given interval sequence.
-
-        The return value is a list of tuples (melody, weight), and must be
-        ordered in non-increasing weight. (You can decide how to break ties.)
-
-        If limit is None, return *every* match for the given interval sequence.
-
-        Precondition:
-            limit is None or limit > 0
-        """
-        pass
-
-    def remove(self, prefix: List[int]) -> None:
-        """Remove all melodies that match the given interval sequence.
-        """
-        pass
-
-
-###############################################################################
-# Sample runs
-###############################################################################
-def sample_letter_autocomplete() -> List[Tuple[str, float]]:
-    """A sample run of the letter autocomplete engine."""
-    engine = LetterAutocompleteEngine({
-        # NOTE: you should also try 'data/google_no_swears.txt' for the file.
-        'file': 'data/lotr.txt',
-        'autocompleter': 'simple',
-        'weight_type': 'sum'
-    })
-    return engine.autocomplete('frodo d', 20)
-
-
-def sample_sentence_autocomplete() -> List[Tuple[str, float]]:
-    """A sample run of the sentence autocomplete engine."""
-    engine = SentenceAutocompleteEngine({
-        'file': 'data/google_searches.csv',
-        'autocompleter': 'simple',
-        'weight_type': 'sum'
-    })
-    return engine.autocomplete('how to', 20)
-
-
-def sample_melody_autocomplete() -> None:
-    """A sample run of the melody autocomplete engine."""
-    engine = MelodyAutocompleteEngine({
-        'file': 'data/random_melodies_c_scale.csv',
-        'autocompleter': 'simple',
-        'weight_type': 'sum'
-    })
-    melodies = engine.autocomplete([2, 2], 20)
-    for melody, _ in melodies:
-        melody.play()
-
-
-if __name__ == '__main__':
-    # import python_ta
-    # python_ta.check_all(config={
-    #     'allowed-io': ['__init__'],
-    #     'extra-imports': ['csv', 'prefix_tree', 'melody']
-    # })
-
-    # This is used to increase the recursion limit so that your sample runs
-    # work even for fairly tall simple prefix trees.
-    import sys
-    sys.setrecursionlimit(5000)
-
-    # print(sample_letter_autocomplete())
-    # print(sample_sentence_autocomplete())
-    # sample_melody_autocomplete()
+"""CSC148 Assignment 2: Autocomplete engines
+
+=== CSC148 Fall 2018 ===
+Department of Computer Science,
+University of Toronto
+
+=== Module description ===
+This file contains starter code for the three different autocomplete engines
+you are writing for this assignment.
+
+As usual, be sure not to change any parts of the given *public interface* in the
+starter code---and this includes the instance attributes, which we will be
+testing directly! You may, however, add new private attributes, methods, and
+top-level functions to this file.
+"""
+from __future__ import annotations
+import codecs
+import csv
+import io
+import time
+import zlib
+from collections import Counter, OrderedDict
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple, Union
+
+from melody import Melody, multi_track_midi
+from prefix_index import load_index, save_index
+from prefix_tree import Autocompleter, SimplePrefixTree, CompactPrefixTree, \
+    CompressedPrefixTree, CachedPrefixTree, VersionedPrefixTree, \
+    InstrumentedAutocompleter, TreeStats
+
+
+# The Autocompleter subclass used for each value of config['autocompleter'].
+_AUTOCOMPLETERS = {
+    'simple': SimplePrefixTree,
+    'compact': CompactPrefixTree,
+    'compressed': CompressedPrefixTree,
+    'cached': CachedPrefixTree
+}
+
+# The number of bytes read from a file at a time.
+_CHUNK_SIZE = 1 << 20
+
+
+class _SanitizeTable(dict):
+    """A str.translate table for lowercased text, which keeps alphanumeric
+    characters and the characters in <keep>, and deletes every other
+    character.
+
+    Entries are computed the first time a character is looked up, so text
+    is sanitized by C-level translate calls over whole strings rather than
+    by a Python loop over their characters.
+
+    === Attributes ===
+    keep: the non-alphanumeric characters kept by this table.
+    """
+    keep: str
+
+    def __init__(self, keep: str) -> None:
+        dict.__init__(self)
+        self.keep = keep
+
+    def __missing__(self, code: int) -> Optional[int]:
+        char = chr(code)
+        result = code if char.isalnum() or char in self.keep else None
+        self[code] = result
+        return result
+
+
+# Sanitizes a single string.
+_SANITIZE = _SanitizeTable(' ')
+# Sanitizes a chunk of a text file, keeping its line breaks.
+_SANITIZE_LINES = _SanitizeTable(' \n')
+
+
+def _read_chunks(path: str, part: Optional[Tuple[int, int]] = None,
+                 chunk_size: int = _CHUNK_SIZE,
+                 translate: bool = True) -> Iterator[str]:
+    """Yield the text of the UTF-8 file at <path>, decoded <chunk_size>
+    bytes at a time.
+
+    If <part> is a pair (start, end), only the bytes in range(start, end)
+    are read; <start> must be the start of a line. If <translate> is true,
+    line breaks are translated to '\\n', as when reading a file opened in
+    text mode.
+    """
+    decoder = codecs.getincrementaldecoder('utf8')()
+    if translate:
+        decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    with open(path, 'rb') as f:
+        remaining = None
+        if part is not None:
+            f.seek(part[0])
+            remaining = part[1] - part[0]
+        while True:
+            size = chunk_size if remaining is None else \
+                min(chunk_size, remaining)
+            data = f.read(size)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield decoder.decode(data)
+    yield decoder.decode(b'', True)
+
+
+def _count_lines(path: str, part: Optional[Tuple[int, int]] = None,
+                 chunk_size: int = _CHUNK_SIZE) -> Tuple[Counter, int]:
+    """Return the number of times each sanitized line of the text file at
+    <path> occurs, together with the total number of lines read.
+
+    Lines that do not contain at least one alphanumeric character after
+    sanitization are counted in the total but left out of the Counter.
+    If <part> is given, only the lines in that byte range of the file are
+    read (see _read_chunks). The file is read <chunk_size> bytes at a time,
+    so memory use is bounded by the number of distinct lines rather than
+    the file size.
+    """
+    counts = Counter()
+    total = 0
+    rest = ''
+    for chunk in _read_chunks(path, part, chunk_size):
+        lines = chunk.lower().translate(_SANITIZE_LINES).split('\n')
+        lines[0] = rest + lines[0]
+        rest = lines.pop()
+        counts.update(lines)
+        total += len(lines)
+    if rest:
+        counts[rest] += 1
+        total += 1
+    for line in [line for line in counts if not line.strip()]:
+        del counts[line]
+    return counts, total
+
+
+def _read_csv_lines(path: str, part: Optional[Tuple[int, int]] = None
+                    ) -> Iterator[str]:
+    """Yield the lines of the CSV file at <path>, with their line breaks,
+    as csv.reader expects them.
+
+    If <part> is given, only the lines in that byte range of the file are
+    read (see _read_chunks).
+    """
+    rest = ''
+    for chunk in _read_chunks(path, part, translate=False):
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if rest:
+        yield rest
+
+
+def _sum_csv_weights(path: str,
+                     parse_row: Callable[[List[str]],
+                                         Optional[Tuple[Any, float]]],
+                     part: Optional[Tuple[int, int]] = None
+                     ) -> Tuple[Dict[Any, float], int]:
+    """Return the total weight of each key in the CSV file at <path>,
+    together with the number of rows read.
+
+    <parse_row> turns a row into a (key, weight) pair, or returns None for
+    a row that should be skipped. Rows with equal keys are summed here, so
+    a key that is repeated thousands of times is inserted only once. If
+    <part> is given, only the rows in that byte range of the file are read
+    (see _read_chunks).
+    """
+    totals = {}
+    rows = 0
+    for row in csv.reader(_read_csv_lines(path, part)):
+        rows += 1
+        parsed = parse_row(row)
+        if parsed is not None:
+            key, weight = parsed
+            totals[key] = totals.get(key, 0) + weight
+    return totals, rows
+
+
+def _parse_sentence_row(row: List[str]) -> Optional[Tuple[str, float]]:
+    """Return the sanitized string and weight stored in a row of a sentence
+    CSV file, or None if the row is blank or too short, or the string has no
+    alphanumeric characters.
+    """
+    if len(row) < 2:
+        return None
+    sentence = row[0].lower().translate(_SANITIZE)
+    if not sentence.strip():
+        return None
+    return sentence, float(row[1])
+
+
+def _parse_melody_row(row: List[str]) -> Optional[Tuple[Melody, float]]:
+    """Return the melody stored in a row of a melody CSV file, with a weight
+    of 1, or None if the row is blank.
+
+    The entries after the name are (pitch, duration) pairs, and the melody
+    ends at the first blank entry.
+    """
+    if not row:
+        return None
+    notes = []
+    for i in range(1, len(row) - 1, 2):
+        if row[i] == '' or row[i + 1] == '':
+            break
+        notes.append((int(row[i]), int(row[i + 1])))
+    return Melody(row[0], notes), 1
+
+
+def _intervals(melody: Melody) -> Tuple[int, ...]:
+    """Return the interval sequence of <melody>.
+
+    The sequence is cached by the melody, and the trees that store prefixes
+    as tuples share it rather than copying it.
+    """
+    return melody.intervals
+
+
+def _shard_of(prefix: List, count: int) -> int:
+    """Return which of <count> shards stores the values with the prefix
+    sequence <prefix>, based on its first element.
+
+    Values with an empty prefix sequence belong to shard 0. The result is the
+    same in every process, unlike hash() of a string.
+    """
+    if not prefix or count == 1:
+        return 0
+    return zlib.crc32(repr(prefix[0]).encode('utf8')) % count
+
+
+def _partition(totals: Dict[Any, float], sequence: Callable[[Any], Sequence],
+               count: int) -> List[Dict[Any, float]]:
+    """Return <totals> split into <count> dicts, the i-th of which holds the
+    values whose prefix sequence belongs to shard number i.
+
+    <sequence> returns the prefix sequence of a value. Since only its first
+    element decides the shard, the shard is computed once per first element.
+    """
+    parts = [{} for _ in range(count)]
+    shards = {}
+    for value, weight in totals.items():
+        prefix = sequence(value)
+        if not prefix:
+            shard = 0
+        else:
+            shard = shards.get(prefix[0])
+            if shard is None:
+                shard = shards[prefix[0]] = _shard_of(prefix, count)
+        parts[shard][value] = weight
+    return parts
+
+
+def _load_stats(lines: int, distinct: int, seconds: float) -> Dict[str, float]:
+    """Return the statistics reported by an engine's load_stats method."""
+    return {
+        'lines': lines,
+        'distinct': distinct,
+        'seconds': seconds,
+        'lines_per_second': lines / seconds if seconds > 0 else 0.0
+    }
+
+
+def _build_autocompleter(config: Dict[str, Any],
+                         items: Iterable[Tuple[Any, float, List]]
+                         ) -> Autocompleter:
+    """Return the Autocompleter selected by <config>, storing the given
+    (value, weight, prefix) triples.
+
+    For the 'cached' autocompleter, config['cache_size'] (if present) is the
+    number of suggestions cached in each internal tree.
+
+    If config['versioned'] is true, the tree is wrapped in a
+    VersionedPrefixTree, so that it can be read by many threads while it is
+    being changed.
+    """
+    cls = _AUTOCOMPLETERS[config['autocompleter']]
+    if cls is CachedPrefixTree and 'cache_size' in config:
+        tree = cls.from_items(config['weight_type'], items,
+                              config['cache_size'])
+    else:
+        tree = cls.from_items(config['weight_type'], items)
+    if config.get('versioned'):
+        return VersionedPrefixTree(tree)
+    return tree
+
+
+# The number of query results each engine caches by default.
+_QUERY_CACHE_SIZE = 1024
+
+
+class _QueryCache:
+    """A bounded cache of autocomplete results, evicting the least recently
+    used prefix when it is full.
+
+    Each prefix keeps the result for the largest limit it has been queried
+    with, so a query with a smaller limit is answered by slicing that result.
+    The cache is invalidated in constant time by bumping its generation:
+    entries from an older generation are treated as misses.
+
+    >>> cache = _QueryCache(2)
+    >>> cache.put(('a',), 3, [('ab', 3.0), ('ac', 2.0), ('ad', 1.0)], 0)
+    >>> cache.get(('a',), 2)
+    [('ab', 3.0), ('ac', 2.0)]
+    >>> cache.get(('a',), 5) is None
+    True
+    >>> cache.put(('b',), None, [('bc', 1.0)], 0)
+    >>> cache.invalidate()
+    >>> cache.get(('b',), None) is None
+    True
+    >>> cache.put(('b',), None, [('bc', 1.0)], cache.generation)
+    >>> cache.put(('c',), None, [], cache.generation)
+    >>> cache.put(('d',), None, [('de', 1.0)], cache.generation)
+    >>> cache.get(('b',), None) is None
+    True
+    >>> cache.get(('d',), 1)
+    [('de', 1.0)]
+    >>> stats = cache.stats()
+    >>> stats['size'], stats['hits'], stats['misses'], stats['evictions']
+    (2, 2, 3, 2)
+
+    === Attributes ===
+    capacity: the maximum number of prefixes cached, or 0 to cache nothing.
+    generation: the number of times this cache has been invalidated.
+    hits: the number of lookups answered from this cache.
+    misses: the number of lookups not answered from this cache.
+    evictions: the number of entries dropped to make room for another.
+
+    === Private Attributes ===
+    _entries:
+        Maps each cached prefix (as a tuple) to its (generation, limit,
+        result), from least to most recently used.
+    """
+    capacity: int
+    generation: int
+    hits: int
+    misses: int
+    evictions: int
+    _entries: OrderedDict
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize an empty cache holding at most <capacity> prefixes."""
+        self.capacity = capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Tuple, limit: Optional[int]
+            ) -> Optional[List[Tuple[Any, float]]]:
+        """Return a copy of the cached result for <key> and <limit>, or None
+        if it cannot be answered from this cache.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            generation, cached_limit, result = entry
+            if generation != self.generation:
+                self._entries.pop(key, None)
+            elif cached_limit is None or len(result) < cached_limit or \
+                    (limit is not None and limit <= cached_limit):
+                # The cached result is either every match, or at least the
+                # first <limit> of them.
+                try:
+                    self._entries.move_to_end(key)
+                except KeyError:
+                    # Evicted by another thread since it was looked up.
+                    pass
+                self.hits += 1
+                return result[:limit]
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, limit: Optional[int],
+            result: List[Tuple[Any, float]], generation: int) -> None:
+        """Cache <result> as the result for <key> and <limit>, computed
+        during the given generation.
+
+        The generation is read by the caller before computing <result>, so
+        that a result computed while the cache was being invalidated is
+        never mistaken for a current one.
+        """
+        if self.capacity == 0:
+            return
+        self._entries[key] = (generation, limit, list(result))
+        try:
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        except KeyError:
+            # Another thread changed the cache at the same time.
+            pass
+
+    def invalidate(self) -> None:
+        """Treat every result cached so far as out of date."""
+        self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters of this cache, and its current size."""
+        return {
+            'capacity': self.capacity,
+            'size': len(self._entries),
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class _IntervalIndex:
+    """The interval sequences of every melody stored by an engine, kept in a
+    NumPy matrix for approximate searches.
+
+    Column j of the matrix holds interval j of every melody, so a search
+    compares one interval of the query against all of the remaining
+    candidates at once. The melodies are in non-increasing order of weight,
+    so the candidates left at the end are already ranked.
+
+    === Attributes ===
+    generation: the generation of the engine's query cache when this index
+        was built; the index is out of date once that changes.
+
+    === Private Attributes ===
+    _matches: every stored (melody, weight) pair, in non-increasing order of
+        weight.
+    _lengths: the number of intervals of each melody, in the same order.
+    _columns: row j holds interval j of each melody, or 0 for a melody with
+        fewer intervals.
+    """
+    generation: int
+    _matches: List[Tuple[Melody, float]]
+    _lengths: Any
+    _columns: Any
+
+    def __init__(self, matches: List[Tuple[Melody, float]],
+                 generation: int) -> None:
+        """Initialize an index of the melodies in <matches>, (melody, weight)
+        pairs in non-increasing order of weight.
+        """
+        import numpy as np
+
+        self.generation = generation
+        self._matches = matches
+        count = len(matches)
+        lengths = np.fromiter((len(_intervals(melody))
+                               for melody, _ in matches),
+                              dtype=np.int64, count=count)
+        width = int(lengths.max()) if count else 0
+        intervals = np.fromiter(
+            chain.from_iterable(_intervals(melody) for melody, _ in matches),
+            dtype=np.int16, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(count), lengths)
+        starts = np.cumsum(lengths) - lengths
+        columns = np.zeros((width, count), dtype=np.int16)
+        columns[np.arange(len(intervals)) - np.repeat(starts, lengths),
+                rows] = intervals
+        self._lengths = lengths
+        self._columns = columns
+
+    def search(self, prefix: List[int], tolerance: int,
+               limit: Optional[int]) -> List[Tuple[Melody, float]]:
+        """Return up to <limit> of the (melody, weight) pairs whose first
+        len(prefix) intervals are each within <tolerance> of the interval of
+        <prefix> in the same place, in non-increasing order of weight.
+        """
+        import numpy as np
+
+        if len(prefix) > len(self._columns):
+            return []
+        candidates = np.flatnonzero(self._lengths >= len(prefix))
+        for column, interval in zip(self._columns, prefix):
+            if not len(candidates):
+                break
+            candidates = candidates[
+                np.abs(column[candidates] - interval) <= tolerance]
+        return [self._matches[i] for i in candidates[:limit].tolist()]
+
+
+class _AutocompleteEngine:
+    """Behaviour shared by the autocomplete engines below.
+
+    === Attributes ===
+    autocompleter: An Autocompleter used by this engine.
+
+    === Private Attributes ===
+    _load_stats: statistics on the file loaded when this engine was created.
+    _query_cache: the recent results of autocomplete.
+    """
+    autocompleter: Autocompleter
+    _load_stats: Dict[str, float]
+    _query_cache: _QueryCache
+
+    @staticmethod
+    def _sequence(prefix: Any) -> List:
+        """Return the prefix sequence passed to the Autocompleter for the
+        prefix <prefix> given to this engine.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _value_sequence(cls, value: Any) -> List:
+        """Return the prefix sequence of <value>, a value stored by this
+        engine.
+        """
+        return cls._sequence(value)
+
+    @staticmethod
+    def _read(config: Dict[str, Any],
+              part: Optional[Tuple[int, int]] = None
+              ) -> Tuple[Dict[Any, float], int]:
+        """Return the total weight of each value in the file config['file'],
+        or in the byte range <part> of it, together with the number of lines
+        or rows read.
+        """
+        raise NotImplementedError
+
+    def _build(self, config: Dict[str, Any], totals: Dict[Any, float],
+               lines: int, start: float) -> None:
+        """Build this engine's Autocompleter, storing each value in <totals>
+        with its total weight, as selected by <config>.
+
+        <lines> is the number of lines or rows read, and <start> is the
+        time.perf_counter() value when reading started.
+        """
+        self.autocompleter = _build_autocompleter(
+            config, ((value, weight, self._value_sequence(value))
+                     for value, weight in totals.items()))
+        self._load_stats = _load_stats(lines, len(self.autocompleter),
+                                       time.perf_counter() - start)
+        self._query_cache = _QueryCache(
+            config.get('query_cache_size', _QUERY_CACHE_SIZE))
+
+    @classmethod
+    def _from_totals(cls, config: Dict[str, Any], totals: Dict[Any, float],
+                     lines: int, start: float) -> _AutocompleteEngine:
+        """Return an engine of this class with the given configuration,
+        storing the values in <totals> rather than those in config['file'].
+
+        See _build.
+        """
+        engine = cls.__new__(cls)
+        engine._build(config, totals, lines, start)
+        return engine
+
+    def _autocomplete(self, prefix: List,
+                      limit: Optional[int]) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix sequence <prefix>,
+        using the query cache.
+        """
+        key = tuple(prefix)
+        generation = self._query_cache.generation
+        result = self._query_cache.get(key, limit)
+        if result is None:
+            result = self.autocompleter.autocomplete(prefix, limit)
+            self._query_cache.put(key, limit, result, generation)
+        return result
+
+    def _autocomplete_many(self, prefixes: List[List], limit: Optional[int]
+                           ) -> List[List[Tuple[Any, float]]]:
+        """Return up to <limit> matches for each of the prefix sequences in
+        <prefixes>, in the same order.
+
+        Batches bypass the query cache, since they are typically far larger
+        than it and would only evict the results of interactive queries.
+        """
+        return self.autocompleter.autocomplete_many(prefixes, limit)
+
+    def _remove(self, prefix: List) -> None:
+        """Remove all values that match the prefix sequence <prefix>, and
+        invalidate the query cache.
+        """
+        self.autocompleter.remove(prefix)
+        self._query_cache.invalidate()
+
+    def _remove_many(self, prefixes: List[List]) -> None:
+        """Remove all values that match any of the prefix sequences in
+        <prefixes>, and invalidate the query cache.
+        """
+        self.autocompleter.remove_many(prefixes)
+        self._query_cache.invalidate()
+
+    def _increment(self, value: Any, delta: float) -> None:
+        """Add <delta> to the weight of <value>, inserting it if it is not
+        stored yet, and invalidate the query cache.
+        """
+        self.autocompleter.increment(value, delta, self._value_sequence(value))
+        self._query_cache.invalidate()
+
+    def query_cache_stats(self) -> Dict[str, int]:
+        """Return the counters of this engine's cache of autocomplete results.
+
+        The keys are 'capacity', 'size' (the number of cached prefixes),
+        'generation' (the number of times the cache has been invalidated),
+        'hits', 'misses' and 'evictions'.
+        """
+        return self._query_cache.stats()
+
+    def invalidate_query_cache(self) -> None:
+        """Discard this engine's cached autocomplete results.
+
+        This must be called after changing self.autocompleter directly, for
+        example by inserting into it rather than calling increment.
+        """
+        self._query_cache.invalidate()
+
+    def load_stats(self) -> Dict[str, float]:
+        """Return statistics on the file loaded when this engine was created.
+
+        The keys are 'lines' (the number of lines or rows read), 'distinct'
+        (the number of distinct values stored), 'seconds' (the time taken to
+        read the file and build the Autocompleter) and 'lines_per_second'.
+        """
+        return dict(self._load_stats)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by this engine's
+        Autocompleter.
+
+        See Autocompleter.memory_stats in prefix_tree.py.
+        """
+        return self.autocompleter.memory_stats()
+
+    def freeze(self) -> None:
+        """Replace this engine's Autocompleter with a read-only copy, which
+        uses less memory and answers queries faster.
+
+        After this call, remove raises TypeError.
+        """
+        if isinstance(self.autocompleter, InstrumentedAutocompleter):
+            self.autocompleter.tree = self.autocompleter.freeze()
+        else:
+            self.autocompleter = self.autocompleter.freeze()
+        self._query_cache.invalidate()
+
+    def instrument(self, callback: Optional[Callable[[str, float, TreeStats],
+                                                     Any]] = None
+                   ) -> TreeStats:
+        """Start counting the work done by this engine's Autocompleter, and
+        return the counters, which are updated by every later operation.
+
+        <callback>, if not None, is called after each operation on the
+        Autocompleter with its name, the seconds it took, and a TreeStats of
+        the work it did. Queries answered by the query cache never reach the
+        Autocompleter. If this engine is already instrumented, its counters
+        are kept and only the callback is replaced.
+        """
+        if not isinstance(self.autocompleter, InstrumentedAutocompleter):
+            self.autocompleter = InstrumentedAutocompleter(self.autocompleter)
+        self.autocompleter.callback = callback
+        return self.autocompleter.stats
+
+    def uninstrument(self) -> None:
+        """Stop counting the work done by this engine's Autocompleter."""
+        if isinstance(self.autocompleter, InstrumentedAutocompleter):
+            self.autocompleter = self.autocompleter.tree
+
+    def save(self, path: str) -> None:
+        """Write the values in this engine to a snapshot file at <path>.
+
+        The engine can later be recreated from the snapshot with load, which
+        is much faster than reading the original file again.
+        """
+        save_index(self.autocompleter, path)
+
+    @classmethod
+    def load(cls, path: str,
+             query_cache_size: int = _QUERY_CACHE_SIZE) -> _AutocompleteEngine:
+        """Return an engine that answers queries from the snapshot file at
+        <path>, written by save, and caches up to <query_cache_size> results.
+
+        The snapshot is mapped into memory rather than rebuilt into a prefix
+        tree, so the returned engine is read-only: its remove method raises
+        TypeError.
+        """
+        start = time.perf_counter()
+        engine = cls.__new__(cls)
+        engine.autocompleter = load_index(path)
+        engine._query_cache = _QueryCache(query_cache_size)
+        engine._load_stats = _load_stats(0, len(engine.autocompleter),
+                                         time.perf_counter() - start)
+        return engine
+
+
+################################################################################
+# Text-based Autocomplete Engines (Task 4)
+################################################################################
+class LetterAutocompleteEngine(_AutocompleteEngine):
+    """An autocomplete engine that suggests strings based on a few letters.
+
+    The *prefix sequence* for a string is the list of characters in the string.
+    This can include space characters.
+
+    This autocomplete engine only stores and suggests strings with lowercase
+    letters, numbers, and space characters; see the section on
+    "Text sanitization" on the assignment handout.
+
+    === Attributes ===
+    autocompleter: An Autocompleter used by this engine.
+
+    === Private Attributes ===
+    _load_stats: statistics on the file loaded when this engine was created.
+    """
+    autocompleter: Autocompleter
+    _load_stats: Dict[str, float]
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Initialize this engine with the given configuration.
+
+        <config> is a dictionary consisting of the following keys:
+            - 'file': the path to a text file
+            - 'autocompleter': one of the strings 'simple', 'compact',
+              'compressed' or 'cached', specifying which subclass of
+              Autocompleter to use.
+            - 'cache_size': optionally, for the 'cached' autocompleter, the
+              number of suggestions cached for each prefix.
+            - 'weight_type': either 'sum' or 'average', which specifies the
+              weight type for the prefix tree.
+            - 'query_cache_size': optionally, the number of autocomplete
+              results to cache (0 disables the cache).
+            - 'versioned': optionally, True to let other threads call
+              autocomplete while remove runs (see VersionedPrefixTree).
+
+        Each line of the specified file counts as one input string.
+        Note that the line may or may not contain spaces.
+        Each string must be sanitized, and if the resulting string contains
+        at least one alphanumeric character, it is inserted into the
+        Autocompleter.
+
+        *Skip lines that do not contain at least one alphanumeric character!*
+
+        When each string is inserted, it is given a weight of one.
+        Note that it is possible for the same string to appear on more than
+        one line of the input file; this would result in that string getting
+        a larger weight (because of how Autocompleter.insert works).
+        """
+        start = time.perf_counter()
+        counts, total = self._read(config)
+        self._build(config, counts, total, start)
+
+    @staticmethod
+    def _read(config: Dict[str, Any],
+              part: Optional[Tuple[int, int]] = None
+              ) -> Tuple[Dict[str, float], int]:
+        """Return the number of times each string occurs in the text file
+        config['file'], or in the byte range <part> of it, together with the
+        number of lines read.
+        """
+        return _count_lines(config['file'], part)
+
+    @staticmethod
+    def _sequence(prefix: str) -> List[str]:
+        """Return the prefix sequence for the prefix string <prefix>."""
+        return list(prefix)
+
+    def autocomplete(self, prefix: str,
+                     limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return up to <limit> matches for the given prefix string.
+
+        The return value is a list of tuples (string, weight), and must be
+        ordered in non-increasing weight. (You can decide how to break ties.)
+
+        If limit is None, return *every* match for the given prefix.
+
+        Note that the given prefix string must be transformed into a list
+        of letters before being passed to the Autocompleter.
+
+        Preconditions:
+            limit is None or limit > 0
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self._autocomplete(self._sequence(prefix), limit)
+
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[str, float]]:
+        """Return up to <limit> strings starting with a string within
+        <max_edits> typos of the given prefix string, with their weights, in
+        non-increasing order of weight.
+
+        A typo is an inserted, deleted or replaced letter. With max_edits
+        == 0, this finds the same strings as autocomplete. The prefix tree
+        is searched best-first by weight, so the time taken depends on
+        <limit> and on the number of near misses of <prefix>, rather than
+        on the number of strings stored. Results are not cached.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self.autocompleter.autocomplete_fuzzy(self._sequence(prefix),
+                                                     max_edits, limit)
+
+    def autocomplete_many(self, prefixes: List[str],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[str, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        string in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each prefix, since
+        prefixes with a common start share the work of finding it.
+
+        Preconditions:
+            limit is None or limit > 0
+            each prefix contains only lowercase alphanumeric characters and
+            spaces
+        """
+        return self._autocomplete_many(
+            [self._sequence(prefix) for prefix in prefixes], limit)
+
+    def remove(self, prefix: str) -> None:
+        """Remove all strings that match the given prefix string.
+
+        Note that the given prefix string must be transformed into a list
+        of letters before being passed to the Autocompleter.
+
+        Precondition: <prefix> contains only lowercase alphanumeric characters
+                      and spaces.
+        """
+        self._remove(self._sequence(prefix))
+
+    def remove_many(self, prefixes: List[str]) -> None:
+        """Remove all strings that match any of the given prefix strings.
+
+        Precondition: each prefix contains only lowercase alphanumeric
+                      characters and spaces.
+        """
+        self._remove_many([self._sequence(prefix) for prefix in prefixes])
+
+    def increment(self, value: str, delta: float = 1) -> None:
+        """Add <delta> to the weight of the string <value>, inserting it if
+        this engine does not store it yet.
+
+        Preconditions:
+            delta > 0
+            <value> contains only lowercase alphanumeric characters and
+            spaces, and at least one alphanumeric character
+        """
+        self._increment(value, delta)
+
+
+class SentenceAutocompleteEngine(_AutocompleteEngine):
+    """An autocomplete engine that suggests strings based on a few words.
+
+    A *word* is a string containing only alphanumeric characters.
+    The *prefix sequence* for a string is the list of words in the string
+    (separated by whitespace). The words themselves do not contain spaces.
+
+    This autocomplete engine only stores and suggests strings with lowercase
+    letters, numbers, and space characters; see the section on
+    "Text sanitization" on the assignment handout.
+
+    === Attributes ===
+    autocompleter: An Autocompleter used by this engine.
+    """
+    autocompleter: Autocompleter
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Initialize this engine with the given configuration.
+
+        <config> is a dictionary consisting of the following keys:
+            - 'file': the path to a CSV file
+            - 'autocompleter': one of the strings 'simple', 'compact',
+              'compressed' or 'cached', specifying which subclass of
+              Autocompleter to use.
+            - 'cache_size': optionally, for the 'cached' autocompleter, the
+              number of suggestions cached for each prefix.
+            - 'weight_type': either 'sum' or 'average', which specifies the
+              weight type for the prefix tree.
+            - 'query_cache_size': optionally, the number of autocomplete
+              results to cache (0 disables the cache).
+            - 'versioned': optionally, True to let other threads call
+              autocomplete while remove runs (see VersionedPrefixTree).
+
+        Precondition:
+        The given file is a *CSV file* where each line has two entries:
+            - the first entry is a string
+            - the second entry is the a number representing the weight of that
+              string
+
+        Note that the line may or may not contain spaces.
+        Each string must be sanitized, and if the resulting string contains
+        at least one word, it is inserted into the Autocompleter.
+
+        *Skip lines that do not contain at least one alphanumeric character!*
+
+        When each string is inserted, it is given THE WEIGHT SPECIFIED ON THE
+        LINE FROM THE CSV FILE. (Updated Nov 19)
+        Note that it is possible for the same string to appear on more than
+        one line of the input file; this would result in that string getting
+        a larger weight.
+        """
+        start = time.perf_counter()
+        totals, rows = self._read(config)
+        self._build(config, totals, rows, start)
+
+    @staticmethod
+    def _read(config: Dict[str, Any],
+              part: Optional[Tuple[int, int]] = None
+              ) -> Tuple[Dict[str, float], int]:
+        """Return the total weight of each string in the CSV file
+        config['file'], or in the byte range <part> of it, together with the
+        number of rows read.
+        """
+        return _sum_csv_weights(config['file'], _parse_sentence_row, part)
+
+    @staticmethod
+    def _sequence(prefix: str) -> List[str]:
+        """Return the prefix sequence for the prefix string <prefix>."""
+        return prefix.split()
+
+    def autocomplete(self, prefix: str,
+                     limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return up to <limit> matches for the given prefix string.
+
+        The return value is a list of tuples (string, weight), and must be
+        ordered in non-increasing weight. (You can decide how to break ties.)
+
+        If limit is None, return *every* match for the given prefix.
+
+        Note that the given prefix string must be transformed into a list
+        of words before being passed to the Autocompleter.
+
+        Preconditions:
+            limit is None or limit > 0
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self._autocomplete(self._sequence(prefix), limit)
+
+    def autocomplete_many(self, prefixes: List[str],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[str, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        string in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each prefix, since
+        prefixes with a common start share the work of finding it.
+
+        Preconditions:
+            limit is None or limit > 0
+            each prefix contains only lowercase alphanumeric characters and
+            spaces
+        """
+        return self._autocomplete_many(
+            [self._sequence(prefix) for prefix in prefixes], limit)
+
+    def remove(self, prefix: str) -> None:
+        """Remove all strings that match the given prefix.
+
+        Note that the given prefix string must be transformed into a list
+        of words before being passed to the Autocompleter.
+
+        Precondition: <prefix> contains only lowercase alphanumeric characters
+                      and spaces.
+        """
+        self._remove(self._sequence(prefix))
+
+    def remove_many(self, prefixes: List[str]) -> None:
+        """Remove all strings that match any of the given prefix strings.
+
+        Precondition: each prefix contains only lowercase alphanumeric
+                      characters and spaces.
+        """
+        self._remove_many([self._sequence(prefix) for prefix in prefixes])
+
+    def increment(self, value: str, delta: float = 1) -> None:
+        """Add <delta> to the weight of the string <value>, inserting it if
+        this engine does not store it yet.
+
+        Preconditions:
+            delta > 0
+            <value> contains only lowercase alphanumeric characters and
+            spaces, and at least one alphanumeric character
+        """
+        self._increment(value, delta)
+
+
+################################################################################
+# Melody-based Autocomplete Engines (Task 5)
+################################################################################
+class MelodyAutocompleteEngine(_AutocompleteEngine):
+    """An autocomplete engine that suggests melodies based on a few intervals.
+
+    The values stored are Melody objects, and the corresponding
+    prefix sequence for a Melody is its interval sequence.
+
+    Because the prefix is based only on interval sequence and not the
+    starting pitch or duration of the notes, it is possible for different
+    melodies to have the same prefix.
+
+    # === Private Attributes ===
+    autocompleter: An Autocompleter used by this engine.
+    _interval_index: the index used by autocomplete_approximate, or None
+        until it is first needed.
+    """
+    autocompleter: Autocompleter
+    _interval_index: Optional[_IntervalIndex] = None
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Initialize this engine with the given configuration.
+
+        <config> is a dictionary consisting of the following keys:
+            - 'file': the path to a CSV file
+            - 'autocompleter': one of the strings 'simple', 'compact',
+              'compressed' or 'cached', specifying which subclass of
+              Autocompleter to use.
+            - 'cache_size': optionally, for the 'cached' autocompleter, the
+              number of suggestions cached for each prefix.
+            - 'weight_type': either 'sum' or 'average', which specifies the
+              weight type for the prefix tree.
+            - 'query_cache_size': optionally, the number of autocomplete
+              results to cache (0 disables the cache).
+            - 'versioned': optionally, True to let other threads call
+              autocomplete while remove runs (see VersionedPrefixTree).
+
+        Precondition:
+        The given file is a *CSV file* where each line has the following format:
+            - The first entry is the name of a melody (a string).
+            - The remaining entries are grouped into pairs (as in Assignment 1)
+              where the first number in each pair is a note pitch,
+              and the second number is the corresponding duration.
+
+            HOWEVER, there may be blank entries (stored as an empty string '');
+            as soon as you encounter a blank entry, stop processing this line
+            and move onto the next line the CSV file.
+
+        Each melody is be inserted into the Autocompleter with a weight of 1.
+        """
+        start = time.perf_counter()
+        totals, rows = self._read(config)
+        self._build(config, totals, rows, start)
+
+    @staticmethod
+    def _read(config: Dict[str, Any],
+              part: Optional[Tuple[int, int]] = None
+              ) -> Tuple[Dict[Melody, float], int]:
+        """Return each melody in the CSV file config['file'], or in the byte
+        range <part> of it, with a weight of 1, together with the number of
+        rows read.
+        """
+        return _sum_csv_weights(config['file'], _parse_melody_row, part)
+
+    @staticmethod
+    def _sequence(prefix: List[int]) -> List[int]:
+        """Return the prefix sequence for the interval sequence <prefix>."""
+        return list(prefix)
+
+    @staticmethod
+    def _value_sequence(value: Melody) -> Tuple[int, ...]:
+        """Return the prefix sequence of <value>, its interval sequence."""
+        return _intervals(value)
+
+    def autocomplete(self, prefix: List[int],
+                     limit: Optional[int] = None) -> List[Tuple[Melody, float]]:
+        """Return up to <limit> matches for the given interval sequence.
+
+        The return value is a list of tuples (melody, weight), and must be
+        ordered in non-increasing weight. (You can decide how to break ties.)
+
+        If limit is None, return *every* match for the given interval sequence.
+
+        Precondition:
+            limit is None or limit > 0
+        """
+        return self._autocomplete(self._sequence(prefix), limit)
+
+    def export_midi(self, prefix: List[int], limit: Optional[int] = None,
+                    separate: bool = False) -> Union[bytes, List[bytes]]:
+        """Return the matches for the given interval sequence as MIDI data,
+        without playing them.
+
+        The result is one MIDI file with a track for each match, in the
+        order autocomplete returns them, or if <separate> is true, a list of
+        MIDI files with one match each. Each distinct note sequence is only
+        encoded by mido once, however many queries return it.
+
+        Precondition:
+            limit is None or limit > 0
+        """
+        melodies = [melody for melody, _ in self.autocomplete(prefix, limit)]
+        if separate:
+            return [melody.midi_bytes() for melody in melodies]
+        return multi_track_midi(melodies)
+
+    def autocomplete_approximate(self, prefix: List[int], tolerance: int = 1,
+                                 limit: Optional[int] = None
+                                 ) -> List[Tuple[Melody, float]]:
+        """Return up to <limit> melodies whose first len(prefix) intervals
+        are each within <tolerance> semitones of the corresponding interval
+        of <prefix>, with their weights, in non-increasing order of weight.
+
+        With a tolerance of 0, this finds the same melodies as autocomplete.
+        Like autocomplete, it ignores the key a melody is played in, since
+        intervals do not depend on the starting pitch.
+
+        Rather than following the 2 * tolerance + 1 branches of the prefix
+        tree that match each interval, this filters a NumPy matrix of the
+        interval sequences of every melody, one interval at a time. The
+        matrix is built by the first call, and again by the first call after
+        this engine changes. NumPy must be installed.
+
+        Preconditions:
+            tolerance >= 0
+            limit is None or limit > 0
+        """
+        index = self._interval_index
+        generation = self._query_cache.generation
+        if index is None or index.generation != generation:
+            index = _IntervalIndex(self.autocompleter.autocomplete([]),
+                                   generation)
+            self._interval_index = index
+        return index.search(self._sequence(prefix), tolerance, limit)
+
+    def autocomplete_many(self, prefixes: List[List[int]],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Melody, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each interval
+        sequence in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each sequence,
+        since sequences with a common start share the work of finding it.
+
+        Precondition:
+            limit is None or limit > 0
+        """
+        return self._autocomplete_many(
+            [self._sequence(prefix) for prefix in prefixes], limit)
+
+    def remove(self, prefix: List[int]) -> None:
+        """Remove all melodies that match the given interval sequence.
+        """
+        self._remove(self._sequence(prefix))
+
+    def remove_many(self, prefixes: List[List[int]]) -> None:
+        """Remove all melodies that match any of the given interval
+        sequences.
+        """
+        self._remove_many([self._sequence(prefix) for prefix in prefixes])
+
+    def increment(self, value: Melody, delta: float = 1) -> None:
+        """Add <delta> to the weight of <value>, inserting it if this engine
+        does not store it yet.
+
+        Precondition: delta > 0
+        """
+        self._increment(value, delta)
+
+
+###############################################################################
+# Sample runs
+###############################################################################
+def sample_letter_autocomplete() -> List[Tuple[str, float]]:
+    """A sample run of the letter autocomplete engine."""
+    engine = LetterAutocompleteEngine({
+        # NOTE: you should also try 'data/google_no_swears.txt' for the file.
+        'file': 'data/lotr.txt',
+        'autocompleter': 'simple',
+        'weight_type': 'sum'
+    })
+    return engine.autocomplete('frodo d', 20)
+
+
+def sample_sentence_autocomplete() -> List[Tuple[str, float]]:
+    """A sample run of the sentence autocomplete engine."""
+    engine = SentenceAutocompleteEngine({
+        'file': 'data/google_searches.csv',
+        'autocompleter': 'simple',
+        'weight_type': 'sum'
+    })
+    return engine.autocomplete('how to', 20)
+
+
+def sample_melody_autocomplete() -> None:
+    """A sample run of the melody autocomplete engine."""
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/random_melodies_c_scale.csv',
+        'autocompleter': 'simple',
+        'weight_type': 'sum'
+    })
+    melodies = engine.autocomplete([2, 2], 20)
+    for melody, _ in melodies:
+        melody.play()
+
+
+if __name__ == '__main__':
+    # import python_ta
+    # python_ta.check_all(config={
+    #     'allowed-io': ['__init__'],
+    #     'extra-imports': ['csv', 'prefix_tree', 'melody']
+    # })
+
+    # print(sample_letter_autocomplete())
+    # print(sample_sentence_autocomplete())
+    # sample_melody_autocomplete()
+    pass
@@ -0,0 +1,317 @@
+"""CSC148 Assignment 2: Prefix tree benchmarks
+
+=== CSC148 Fall 2018 ===
+Department of Computer Science,
+University of Toronto
+
+=== Module Description ===
+This file contains a benchmark harness comparing the Autocompleter classes in
+prefix_tree.py on synthetic corpora, so that their speed and memory use can be
+compared, and tracked from one version of the code to the next.
+
+Three kinds of corpus are generated, each with Zipfian weights:
+
+    letters     random strings, with the letters of each one as its prefix
+    sentences   sentences of words drawn from a Zipfian vocabulary, with the
+                words of each one as its prefix
+    intervals   interval sequences like those of the melody engine
+
+A corpus depends only on its kind, its size and the seed, so two runs with the
+same arguments time exactly the same work. For each tree class, corpus and
+size, the harness times insert (one value at a time), from_items (a bulk
+load), autocomplete at several limits and remove, and records the peak memory
+used by a bulk load. The results are written as JSON:
+
+    python benchmark.py --sizes 1000 100000 --output before.json
+
+Each result also has a digest of the autocomplete answers, which differs
+between two runs only if the answers do.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import zlib
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prefix_tree import Autocompleter, SimplePrefixTree, CompactPrefixTree, \
+    CompressedPrefixTree, CachedPrefixTree
+
+
+# The classes that can be benchmarked, by name.
+_TREES = {
+    'simple': SimplePrefixTree,
+    'compact': CompactPrefixTree,
+    'compressed': CompressedPrefixTree,
+    'cached': CachedPrefixTree
+}
+
+# The exponent of the Zipfian distributions: the value of rank r has a weight
+# proportional to 1 / r ** _ZIPF_EXPONENT.
+_ZIPF_EXPONENT = 1.07
+
+# The limits autocomplete is timed with.
+_LIMITS = [1, 10, 100, None]
+
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+_VOCABULARY_SIZE = 20000
+
+
+def _zipf_weights(count: int) -> List[float]:
+    """Return the Zipfian weights of the values of ranks 1 to <count>."""
+    return [1000000.0 / rank ** _ZIPF_EXPONENT for rank in range(1, count + 1)]
+
+
+def _letter_corpus(size: int, rng: random.Random) -> List[Tuple[Any, List]]:
+    """Return <size> distinct (value, prefix) pairs of random strings."""
+    seen = set()
+    pairs = []
+    while len(pairs) < size:
+        # Lengths grow with the corpus, so that it can hold <size> strings.
+        length = rng.randint(3, 8 + len(str(size)))
+        value = ''.join(rng.choices(_ALPHABET, k=length))
+        if value not in seen:
+            seen.add(value)
+            pairs.append((value, list(value)))
+    return pairs
+
+
+def _sentence_corpus(size: int,
+                     rng: random.Random) -> List[Tuple[Any, List]]:
+    """Return <size> distinct (value, prefix) pairs of sentences, whose words
+    follow a Zipfian distribution.
+    """
+    vocabulary = [''.join(rng.choices(_ALPHABET, k=rng.randint(2, 9)))
+                  for _ in range(_VOCABULARY_SIZE)]
+    cumulative = list(accumulate(_zipf_weights(_VOCABULARY_SIZE)))
+    seen = set()
+    pairs = []
+    while len(pairs) < size:
+        words = rng.choices(vocabulary, cum_weights=cumulative,
+                            k=rng.randint(2, 8))
+        value = ' '.join(words)
+        if value not in seen:
+            seen.add(value)
+            pairs.append((value, words))
+    return pairs
+
+
+def _interval_corpus(size: int,
+                     rng: random.Random) -> List[Tuple[Any, List]]:
+    """Return <size> (value, prefix) pairs of melody names and interval
+    sequences, mostly small steps as in real melodies.
+    """
+    steps = list(range(-12, 13))
+    cumulative = list(accumulate(1.0 / (1 + abs(step)) ** 2
+                                 for step in steps))
+    return [(f'melody {i}',
+             rng.choices(steps, cum_weights=cumulative,
+                         k=rng.randint(3, 24)))
+            for i in range(size)]
+
+
+# The corpus generator for each kind of corpus.
+_CORPORA = {
+    'letters': _letter_corpus,
+    'sentences': _sentence_corpus,
+    'intervals': _interval_corpus
+}
+
+
+def make_corpus(kind: str, size: int,
+                seed: int = 0) -> List[Tuple[Any, float, List]]:
+    """Return a corpus of <size> (value, weight, prefix) triples of the given
+    kind, in random order.
+
+    The weights follow a Zipfian distribution over the values. The corpus
+    depends only on <kind>, <size> and <seed>.
+
+    >>> make_corpus('letters', 3) == make_corpus('letters', 3)
+    True
+    >>> len(make_corpus('sentences', 50))
+    50
+    """
+    rng = random.Random(f'{kind}/{size}/{seed}')
+    pairs = _CORPORA[kind](size, rng)
+    weights = _zipf_weights(size)
+    rng.shuffle(weights)
+    return [(value, weight, prefix)
+            for (value, prefix), weight in zip(pairs, weights)]
+
+
+def _query_prefixes(corpus: List[Tuple[Any, float, List]], count: int,
+                    rng: random.Random) -> List[List]:
+    """Return <count> prefixes of the prefixes in <corpus>, chosen like the
+    values of a query log: by weight, and cut at a random length.
+    """
+    cumulative = list(accumulate(weight for _, weight, _ in corpus))
+    chosen = rng.choices(corpus, cum_weights=cumulative, k=count)
+    return [prefix[:rng.randint(0, min(len(prefix), 4))]
+            for _, _, prefix in chosen]
+
+
+def _timed(function: Callable[[], Any]) -> Tuple[float, Any]:
+    """Return the seconds taken by calling <function>, and its result.
+
+    The garbage collector is disabled while it runs, so that a collection
+    triggered by earlier work is not charged to <function>.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = function()
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+
+def _insert_all(cls: type, weight_type: str,
+                corpus: List[Tuple[Any, float, List]]) -> Autocompleter:
+    """Return a tree of <cls> built by inserting each triple in <corpus>."""
+    tree = cls(weight_type)
+    for value, weight, prefix in corpus:
+        tree.insert(value, weight, prefix)
+    return tree
+
+
+def _peak_memory(cls: type, weight_type: str,
+                 corpus: List[Tuple[Any, float, List]]) -> Dict[str, int]:
+    """Return the peak memory allocated while bulk loading <corpus> into a
+    tree of <cls>, and the memory the finished tree keeps, in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tree = cls.from_items(weight_type, corpus)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tree
+    return {'peak_bytes': peak, 'tree_bytes': current}
+
+
+def run_benchmark(tree: str, kind: str, size: int, weight_type: str = 'sum',
+                  queries: int = 1000, seed: int = 0,
+                  memory: bool = True) -> Dict[str, Any]:
+    """Return the measurements of the tree class named <tree> on a corpus of
+    the given kind and size.
+
+    Times are in seconds per operation. <queries> prefixes are timed with
+    each limit in _LIMITS, and as many prefixes (up to the corpus size) are
+    removed. If <memory> is false, memory use is not measured, which saves
+    building the tree a third time under tracemalloc.
+    """
+    cls = _TREES[tree]
+    corpus = make_corpus(kind, size, seed)
+    rng = random.Random(f'queries/{kind}/{size}/{seed}')
+    prefixes = _query_prefixes(corpus, queries, rng)
+    removals = [prefix for prefix in _query_prefixes(corpus, min(queries, size),
+                                                     rng) if prefix]
+    result = {
+        'tree': tree,
+        'corpus': kind,
+        'size': size,
+        'weight_type': weight_type,
+        'queries': queries
+    }
+
+    seconds, _ = _timed(lambda: _insert_all(cls, weight_type, corpus))
+    result['insert_s'] = seconds / size
+    seconds, built = _timed(lambda: cls.from_items(weight_type, corpus))
+    result['bulk_load_s'] = seconds
+    result['values'] = len(built)
+
+    digest = 0
+    result['autocomplete_s'] = {}
+    for limit in _LIMITS:
+        seconds, answers = _timed(
+            lambda: [built.autocomplete(prefix, limit) for prefix in prefixes])
+        result['autocomplete_s'][str(limit)] = seconds / len(prefixes)
+        digest = zlib.crc32(repr([[value for value, _ in answer]
+                                  for answer in answers]).encode('utf8'),
+                            digest)
+    result['digest'] = f'{digest:08x}'
+
+    seconds, _ = _timed(lambda: [built.remove(prefix) for prefix in removals])
+    result['remove_s'] = seconds / max(len(removals), 1)
+    result['remaining'] = len(built)
+    del built
+
+    if memory:
+        result.update(_peak_memory(cls, weight_type, corpus))
+    return result
+
+
+def run_suite(trees: List[str], corpora: List[str], sizes: List[int],
+              weight_type: str = 'sum', queries: int = 1000, seed: int = 0,
+              memory: bool = True,
+              log: Optional[Callable[[str], Any]] = None) -> Dict[str, Any]:
+    """Return the results of run_benchmark for every combination of the
+    given trees, corpora and sizes, together with a description of the
+    machine they ran on.
+
+    <log>, if given, is called with a line of progress after each result.
+    """
+    results = []
+    for kind in corpora:
+        for size in sizes:
+            for tree in trees:
+                result = run_benchmark(tree, kind, size, weight_type,
+                                       queries, seed, memory)
+                results.append(result)
+                if log is not None:
+                    log(f'{tree:>10} {kind:>9} {size:>8}: '
+                        f'insert {result["insert_s"] * 1e6:.2f}us '
+                        f'bulk {result["bulk_load_s"]:.3f}s '
+                        f'query@10 '
+                        f'{result["autocomplete_s"]["10"] * 1e6:.1f}us')
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': results
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmark suite with the command line arguments <argv>."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the prefix trees on synthetic corpora.')
+    parser.add_argument('--trees', nargs='+', choices=sorted(_TREES),
+                        default=sorted(_TREES))
+    parser.add_argument('--corpora', nargs='+', choices=sorted(_CORPORA),
+                        default=sorted(_CORPORA))
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1000, 10000, 100000],
+                        help='corpus sizes, e.g. 1000 1000000')
+    parser.add_argument('--weight-type', choices=['sum', 'average'],
+                        default='sum')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip measuring memory use')
+    parser.add_argument('--output', help='write the JSON results here '
+                                         'instead of to standard output')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.trees, args.corpora, args.sizes, args.weight_type,
+                       args.queries, args.seed, not args.no_memory,
+                       lambda line: print(line, file=sys.stderr))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
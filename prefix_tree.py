@@ -15,7 +15,17 @@ testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
 """
 from __future__ import annotations
-from typing import Any, List, Optional, Tuple
+import gc
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple
 
 
 ################################################################################
@@ -24,6 +34,8 @@ from typing import Any, List, Optional, Tuple
 class Autocompleter:
     """An abstract class representing the Autocompleter Abstract Data Type.
     """
+    __slots__ = ()
+
     def __len__(self) -> int:
         """Return the number of values stored in this Autocompleter."""
         raise NotImplementedError
@@ -59,15 +71,187 @@ class Autocompleter:
         """
         raise NotImplementedError
 
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        An edit inserts, deletes or replaces one element (the Levenshtein
+        distance). With max_edits == 0, this returns the same values as
+        autocomplete. The return value is ordered like that of autocomplete.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+        """
+        raise NotImplementedError
+
     def remove(self, prefix: List) -> None:
         """Remove all values that match the given prefix.
         """
         raise NotImplementedError
 
+    def remove_many(self, prefixes: List[List]) -> None:
+        """Remove all values that match any of the given prefixes.
+
+        Prefixes that extend another given prefix are skipped, since their
+        values are removed with it.
+
+        Precondition: the elements of the prefixes can be compared with each
+        other.
+        """
+        previous = None
+        for prefix in sorted({tuple(prefix) for prefix in prefixes}):
+            if previous is None or prefix[:len(previous)] != previous:
+                self.remove(list(prefix))
+                previous = prefix
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order.
+
+        Subclasses answer all of the prefixes in a single walk of their tree
+        where possible, rather than descending from the root for each one.
+
+        Precondition: limit is None or limit > 0.
+        """
+        return [self.autocomplete(prefix, limit) for prefix in prefixes]
+
+    def increment(self, value: Any, delta: float, prefix: List) -> None:
+        """Add <delta> to the weight of <value>, which is associated with the
+        prefix sequence <prefix>.
+
+        If <value> is not in this Autocompleter, it is inserted with weight
+        <delta>. This is meant for weights updated at a high rate, such as
+        live popularity counts: the trees in this module keep each list of
+        subtrees sorted by moving only the subtrees whose weight changed,
+        found by binary search.
+
+        Preconditions:
+            delta > 0
+            <value> is either not in this Autocompleter, or was previously
+            inserted with the SAME prefix sequence
+        """
+        self.insert(value, delta, prefix)
+
+    def freeze(self) -> FrozenPrefixIndex:
+        """Return a read-only copy of this Autocompleter.
+
+        The copy answers autocomplete queries like this Autocompleter, but
+        stores its values in a few flat arrays rather than one object per
+        tree, and raises TypeError on insert and remove.
+        """
+        arrays, values, symbols = _flatten(self)
+        return FrozenPrefixIndex(self._weight_type, len(self), arrays,
+                                 symbols, values)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by this Autocompleter.
+
+        The keys are:
+            'leaves', 'internal': the number of leaves and of internal trees.
+            'compressible': the number of internal trees whose only subtree
+                is an internal tree, which a compressed tree would merge.
+            'prefix_elements': the number of prefix elements stored for the
+                common prefixes of the internal trees.
+            'bytes': the approximate number of bytes used by each part of
+                the tree, and their 'total'. Values are measured shallowly,
+                with sys.getsizeof.
+            'depth_histogram': the number of leaves with each number of
+                trees above them.
+            'fan_out': the number of internal trees with each number of
+                subtrees.
+            'compression_ratio': the number of trees a SimplePrefixTree
+                storing the same values would have, divided by the number of
+                trees here.
+        """
+        raise NotImplementedError
+
 
 ################################################################################
 # SimplePrefixTree (Tasks 1-3)
 ################################################################################
+class _SubtreeList(list):
+    """The subtrees of a prefix tree, in non-increasing order of weight.
+
+    When the weight of a subtree changes, it is moved to its new place rather
+    than the list being scanned or sorted again. Both its old and its new
+    place are found by binary search, so this takes O(log n) comparisons for
+    n siblings, plus one move of the list's items in memory. Only siblings
+    tied with the subtree's old weight are scanned.
+    """
+    __slots__ = ()
+
+    def copy(self) -> _SubtreeList:
+        """Return a shallow copy of this list."""
+        return _SubtreeList(self)
+
+    def add(self, subtree: Any) -> None:
+        """Insert <subtree> in front of the subtrees whose weight is not
+        greater than its own.
+        """
+        self.insert(self._bound(subtree.weight), subtree)
+
+    def discard(self, subtree: Any) -> None:
+        """Remove <subtree> from this list."""
+        del self[self._index_of(subtree, subtree.weight)]
+
+    def reweigh(self, subtree: Any, old_weight: float) -> None:
+        """Move <subtree>, which was placed here with weight <old_weight>, to
+        its place for its current weight.
+        """
+        i = self._index_of(subtree, old_weight)
+        weight = subtree.weight
+        if (i == 0 or self[i - 1].weight >= weight) and \
+                (i + 1 == len(self) or self[i + 1].weight <= weight):
+            return None
+        del self[i]
+        self.insert(self._bound(weight), subtree)
+        return None
+
+    def _bound(self, weight: float) -> int:
+        """Return the index of the first subtree whose weight is not greater
+        than <weight>.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle].weight > weight:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _index_of(self, subtree: Any, weight: float) -> int:
+        """Return the index of <subtree>, which is placed with <weight>.
+
+        The weight of <subtree> itself may already have changed, so the
+        search compares <weight> rather than its current weight.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            item = self[middle]
+            if item is subtree:
+                return middle
+            if item.weight > weight:
+                low = middle + 1
+            else:
+                high = middle
+        i = low
+        while i < len(self) and self[i] is not subtree:
+            i += 1
+        if i == len(self):
+            # Trees assembled by hand (as in the doctests) may not be sorted.
+            i = 0
+            while self[i] is not subtree:
+                i += 1
+        return i
+
+
 class SimplePrefixTree(Autocompleter):
     """A simple prefix tree.
 
@@ -90,6 +274,13 @@ class SimplePrefixTree(Autocompleter):
         The type of accumulated weight being used for internal values in this
         tree.
     size: number of subtrees to this tree
+    _children:
+        The internal subtrees of this tree, keyed by the element their
+        common prefix adds to this tree's common prefix.
+    _max_weight:
+        The largest weight of a leaf in this tree, or 0 if this tree is
+        empty. This bounds the weight of every value autocomplete can find
+        below this tree, even when self.weight is an average.
 
     === Representation invariants ===
     - self.weight >= 0
@@ -120,9 +311,14 @@ class SimplePrefixTree(Autocompleter):
     value: Any
     weight: float
     _weight_sum: float
-    subtrees: List[SimplePrefixTree]
+    subtrees: _SubtreeList
     _weight_type: str
     size: int
+    _children: Dict[Any, SimplePrefixTree]
+    _max_weight: float
+
+    __slots__ = ('value', 'weight', '_weight_sum', 'subtrees', '_weight_type',
+                 'size', '_children', '_max_weight')
 
     def __init__(self, weight_type: str) -> None:
         """Initialize an empty simple prefix tree.
@@ -137,13 +333,63 @@ class SimplePrefixTree(Autocompleter):
         self.weight = 0
         self._weight_sum = 0
         self.value = []
-        self.subtrees = []
+        self.subtrees = _SubtreeList()
         self.size = 0
+        self._children = {}
+        self._max_weight = 0
 
     def __len__(self):
         """Returns the amount of leaves in the tree """
         return self.size
 
+    @classmethod
+    def from_items(cls, weight_type: str,
+                   items: Iterable[Tuple[Any, float, List]]
+                   ) -> SimplePrefixTree:
+        """Return a new tree of this class storing every value in <items>.
+
+        <items> is an iterable of (value, weight, prefix) triples. The result
+        stores the same values with the same weights as inserting each triple
+        in turn into an empty tree, but it is built in a single pass over the
+        triples sorted by prefix: each tree is created once, and its size,
+        weights and subtree order are computed once, after its last subtree
+        has been added.
+
+        Preconditions:
+            weight_type == 'sum' or weight_type == 'average'
+            every weight is > 0
+            every value is hashable, and appears only with a single prefix
+            the elements of the prefixes can be compared with each other
+
+        >>> tree = SimplePrefixTree.from_items('sum', [
+        ...     ('cat', 1, ['c', 'a', 't']), ('car', 3, ['c', 'a', 'r']),
+        ...     ('cat', 1, ['c', 'a', 't'])])
+        >>> len(tree)
+        2
+        >>> tree.autocomplete(['c', 'a'])
+        [('car', 3), ('cat', 2)]
+        """
+        tree = cls(weight_type)
+        with _gc_paused():
+            path = [tree]
+            previous = ()
+            for prefix, value, weight in _aggregate(items):
+                depth = _common_length(previous, prefix)
+                while len(path) > depth + 1:
+                    _recount(path.pop())
+                depth = len(path) - 1
+                while depth < len(prefix):
+                    subtree = path[-1]._new_internal(prefix, depth + 1, 0)
+                    path[-1].subtrees.append(subtree)
+                    path[-1]._index_subtree(subtree, prefix[depth])
+                    path.append(subtree)
+                    depth += 1
+                path[-1].subtrees.append(path[-1]._new_leaf(value, weight))
+                previous = prefix
+            while path:
+                _recount(path.pop())
+        return tree
+
     def insert(self, value: Any, weight: float, prefix: List):
         """Insert the given value into this Autocompleter.
 
@@ -182,36 +428,125 @@ class SimplePrefixTree(Autocompleter):
         >>> tree.subtrees[0].subtrees[0].subtrees[0].subtrees[0].value
         'dog'
         """
-        self.size += 1
-        if self.is_empty():
-            self._insert_empty(value, weight, prefix, 0)
+        self._insert(value, weight, prefix, 0)
+
+    def _insert(self, value: Any, weight: float, prefix: List,
+                depth: int, stats: Optional[TreeStats] = None) -> bool:
+        """Insert <value> into this tree, whose common prefix is
+        prefix[:depth].
+
+        Return True if a new leaf was created, or False if <weight> was added
+        to a leaf that already stored <value>. If <stats> is given, the work
+        done is added to it.
+        """
+        path = [self]
+        tree = self
+        while depth < len(prefix):
+            child = tree._child(prefix[depth])
+            if child is None:
+                break
+            path.append(child)
+            tree = child
+            depth += 1
+
+        leaf = None
+        if depth == len(prefix):
+            for subtree in tree.subtrees:
+                if subtree.is_leaf() and subtree.value == value:
+                    leaf = subtree
+                    break
+        if leaf is not None:
+            old_weight = leaf.weight
+            leaf.weight += weight
+            leaf._max_weight = leaf.weight
+            tree.subtrees.reweigh(leaf, old_weight)
+            max_weight = leaf.weight
         else:
-            for subtree in self.subtrees:
-                if subtree.value == prefix[0:len(subtree.value)]:
-                    self._adjust_weight(weight)
-                    subtree.insert(value, weight, prefix)
-                    return None
-                elif subtree.value == value:
-                    self._adjust_weight(weight)
-                    subtree.weight += weight
-                    return None
-            for i in range(len(self.subtrees)):
-                if self.subtrees[i].weight <= weight:
-                    self._insert_empty(value, weight, prefix, i)
-                    return None
-            self._insert_empty(value, weight, prefix, len(self.subtrees))
+            max_weight = weight
+
+        parent = None
+        for subtree in path:
+            old_weight = subtree.weight
+            if leaf is None:
+                subtree.size += 1
+            subtree._adjust_weight(weight)
+            subtree._max_weight = max(subtree._max_weight, max_weight)
+            if parent is not None:
+                parent.subtrees.reweigh(subtree, old_weight)
+            parent = subtree
+        if leaf is None:
+            tree._insert_empty(value, weight, prefix, depth)
+        if stats is not None:
+            stats.nodes_visited += len(path)
+            # One lookup per tree below this one, one more if it failed, and
+            # the subtrees scanned for a leaf storing <value>.
+            stats.comparisons += len(path) - 1 + (depth < len(prefix)) + \
+                (len(tree.subtrees) if depth == len(prefix) else 0)
+            if leaf is None:
+                stats.allocations += len(prefix) - depth + 1
+        return leaf is None
 
     def _insert_empty(self, value: Any, weight: float, prefix: List,
-                      index: int) -> None:
-        """helper function for inserting into an empty tree"""
-        self._adjust_weight(weight)
-        if self.value == prefix:
-            self.subtrees.append(new_subtree(value, weight, self._weight_type))
-        else:
-            self.subtrees.insert(index, new_subtree(self.value +
-                                                    [prefix[len(self.value)]],
-                                                    weight, self._weight_type))
-            self.subtrees[index]._insert_empty(value, weight, prefix, 0)
+                      depth: int) -> None:
+        """helper function for hanging a new path for prefix[depth:] below
+        this tree, ending in a leaf storing <value>.
+
+        This tree's own size and weight must already account for <value>.
+        """
+        tree = self
+        while depth < len(prefix):
+            subtree = tree._new_internal(prefix, depth + 1, weight)
+            tree._add_subtree(subtree, prefix[depth])
+            tree = subtree
+            depth += 1
+        tree._add_subtree(tree._new_leaf(value, weight))
+
+    def _new_leaf(self, value: Any, weight: float) -> SimplePrefixTree:
+        """Return a new leaf storing <value> with the given weight."""
+        return new_subtree(value, weight, self._weight_type)
+
+    def _new_internal(self, prefix: List, depth: int,
+                      weight: float) -> SimplePrefixTree:
+        """Return a new internal tree for the common prefix prefix[:depth],
+        holding a single value of the given weight.
+        """
+        subtree = new_subtree(list(prefix[:depth]), weight, self._weight_type)
+        subtree._weight_sum = weight
+        return subtree
+
+    def _add_subtree(self, subtree: SimplePrefixTree,
+                     symbol: Any = None) -> None:
+        """Insert <subtree> into self.subtrees, keeping the list sorted in
+        non-increasing order of weight.
+
+        If <subtree> is an internal tree, <symbol> is the last element of its
+        common prefix, and is used to index it in self._children.
+        """
+        self.subtrees.add(subtree)
+        self._index_subtree(subtree, symbol)
+
+    def _index_subtree(self, subtree: SimplePrefixTree, symbol: Any) -> None:
+        """Record <subtree>, which is already in self.subtrees, in
+        self._children under <symbol> (if it is not None).
+        """
+        if symbol is not None:
+            self._children[symbol] = subtree
+
+    def _child(self, symbol: Any) -> Optional[SimplePrefixTree]:
+        """Return the internal subtree whose common prefix extends this tree's
+        by <symbol>, or None if there is no such subtree.
+        """
+        child = self._children.get(symbol)
+        if child is None and not self._children:
+            # Trees assembled by hand (as in the doctests) bypass the index,
+            # so build it from a scan. A tree that has an index has a
+            # complete one: insert always looks a symbol up here before
+            # adding a subtree, so the scan happens before the first add.
+            for subtree in self.subtrees:
+                if subtree.subtrees:
+                    self._children[subtree.value[-1]] = subtree
+            child = self._children.get(symbol)
+        return child
 
     def _adjust_weight(self, weight: float) -> None:
         self._weight_sum += weight
@@ -228,6 +563,24 @@ class SimplePrefixTree(Autocompleter):
         """Return whether this simple prefix tree is a leaf."""
         return self.weight > 0 and self.subtrees == []
 
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by this tree.
+
+        See Autocompleter.memory_stats.
+
+        >>> tree = SimplePrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> stats = tree.memory_stats()
+        >>> stats['leaves'], stats['internal'], stats['compressible']
+        (2, 5, 2)
+        >>> stats['prefix_elements']
+        9
+        >>> stats['depth_histogram'], stats['fan_out']
+        ({4: 2}, {1: 4, 2: 1})
+        """
+        return _memory_stats(self)
+
     def __str__(self) -> str:
         """Return a string representation of this tree.
 
@@ -242,11 +595,14 @@ class SimplePrefixTree(Autocompleter):
         """
         if self.is_empty():
             return ''
-        else:
-            s = '  ' * depth + f'{self.value} ({self.weight})\n'
-            for subtree in self.subtrees:
-                s += subtree._str_indented(depth + 1)
-            return s
+        lines = []
+        stack = [(self, depth)]
+        while stack:
+            tree, depth = stack.pop()
+            lines.append('  ' * depth + f'{tree.value} ({tree.weight})\n')
+            stack.extend((subtree, depth + 1)
+                         for subtree in reversed(tree.subtrees))
+        return ''.join(lines)
 
     def autocomplete(self, prefix: List,
                      limit: Optional[int] = None) -> List[Tuple[Any, float]]:
@@ -256,90 +612,199 @@ class SimplePrefixTree(Autocompleter):
         If limit is None, return *every* match for the given prefix.
         Precondition: limit is None or limit > 0.
         """
-        if self.is_empty():
+        tree = self._descend(prefix)
+        if tree is None:
             return []
-        else:
-            lst = []
-            if self.value == prefix:
-                lst += self._iterate_helper(limit)
-            elif self.value == prefix[0: len(self.value)]:
-                for subtree in self.subtrees:
-                    lst += subtree.autocomplete(prefix, limit)
-            return lst
-
-    def _iterate_helper(self, limit: Optional[int]) -> List[Tuple[Any, float]]:
-        if self.is_leaf():
-            return [(self.value, self.weight)]
-        else:
-            lst = []
-            for subtree in self.subtrees:
-                if limit is None or len(lst) < limit:
-                    lst.extend(subtree._iterate_helper(limit))
-            return lst
+        return self._suggest(tree, limit)
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order.
+
+        The distinct prefixes are sorted, and each one continues the descent
+        from the tree for its longest common prefix with the one before it,
+        so each tree along the way is looked up only once.
+
+        Preconditions:
+            limit is None or limit > 0
+            the elements of the prefixes can be compared with each other
+
+        >>> tree = SimplePrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> tree.autocomplete_many([['c', 'a'], ['d'], ['x'], ['c']], 1)
+        [[('cat', 2.0)], [('dog', 4.0)], [], [('cat', 2.0)]]
+        """
+        if self.is_empty() or self.is_leaf() or self.value != []:
+            return Autocompleter.autocomplete_many(self, prefixes, limit)
+        results = {}
+        # path[i] is the tree for previous[:i], for as far as it exists.
+        path = [self]
+        previous = ()
+        for key in sorted({tuple(prefix) for prefix in prefixes}):
+            del path[min(_common_length(previous, key), len(path) - 1) + 1:]
+            tree = path[-1]
+            for symbol in key[len(path) - 1:]:
+                tree = tree._child(symbol)
+                if tree is None:
+                    break
+                path.append(tree)
+            results[key] = [] if tree is None else self._suggest(tree, limit)
+            previous = key
+        return [list(results[tuple(prefix)]) for prefix in prefixes]
+
+    def _suggest(self, tree: SimplePrefixTree, limit: Optional[int],
+                 stats: Optional[TreeStats] = None
+                 ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> of the values in <tree>, a tree below this
+        one, in non-increasing order of weight.
+
+        If <stats> is given, the work done is added to it.
+        """
+        return _top_k(tree, limit, stats)
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        See Autocompleter.autocomplete_fuzzy.
+
+        >>> tree = SimplePrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> tree.autocomplete_fuzzy(['c', 'o', 'r'], 1)
+        [('car', 1.0)]
+        >>> tree.autocomplete_fuzzy(['c', 'o'], 1)
+        [('dog', 4.0), ('cat', 2.0), ('car', 1.0)]
+        >>> tree.autocomplete_fuzzy(['x', 'a', 't'], 1, 1)
+        [('cat', 2.0)]
+        """
+        return _fuzzy_top_k(self, prefix, max_edits, limit)
+
+    def _descend(self, prefix: List, stats: Optional[TreeStats] = None
+                 ) -> Optional[SimplePrefixTree]:
+        """Return the tree below this one whose common prefix is <prefix>,
+        or None if no value in this tree matches <prefix>.
+
+        If <stats> is given, the work done is added to it.
+        """
+        if self.is_empty() or self.is_leaf():
+            return None
+        depth = len(self.value)
+        if depth and self.value != list(prefix[:depth]):
+            return None
+        tree = self
+        for symbol in prefix[depth:]:
+            tree = tree._child(symbol)
+            if tree is None:
+                break
+        if stats is not None:
+            # Only counted when instrumented, so walk again to find how far
+            # the descent got rather than slow down the loop above.
+            found = self
+            looked = 0
+            for symbol in prefix[depth:]:
+                found = found._child(symbol)
+                looked += 1
+                if found is None:
+                    break
+            stats.nodes_visited += looked + (found is not None)
+            stats.comparisons += looked
+        return tree
 
     def remove(self, prefix: List) -> None:
         """Remove all values that match the given prefix.
-        """
-        search_list = self._find_last_double(prefix, self)
-        print('search list')
-        for item in search_list:
-            print(item)
-        self._change_all_weights(prefix, search_list[0], search_list[1], search_list[2])
 
-    def _find_last_double(self, prefix: List, last: Optional[SimplePrefixTree]) -> List:
-        """ SOMETHING"""
-        if self.is_empty():
-            print('option 1')
-            return []
-        else:
-            print(self.value)
-            lst = []
-            if self.value == prefix:
-                print('option 2')
-                print("tree")
-                print(self)
-                print("weight")
-                print(self.weight)
-                print("size")
-                print(self.size)
-                return [last, self.weight, self.size]
-            elif self.value == prefix[:len(self.value)]:
-                print('option 3')
-                if len(self.subtrees) > 1:
-                    print('option 3_1')
-                    last = self
-                for subtree in self.subtrees:
-                    print('option 3_2')
-                    lst.extend(subtree._find_last_double(prefix, last))
-            print('option 4')
-            return lst
-
-    def _change_all_weights(self, prefix: List, last: SimplePrefixTree, weight_sum: float, removed_size: int) -> None:
-        """SOMETHING"""
-        if self.is_empty():
+        The tree for <prefix> is found in a single descent and detached from
+        its parent, along with any ancestors left without subtrees. The
+        remaining ancestors then have their size and weights reduced on the
+        way back up, and are moved to keep their siblings in order.
+
+        >>> tree = SimplePrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> tree.remove(['c', 'a', 't'])
+        >>> tree.autocomplete([])
+        [('dog', 4.0), ('car', 1.0)]
+        >>> tree.remove(['d'])
+        >>> print(tree, end='')
+        [] (1.0)
+          ['c'] (1.0)
+            ['c', 'a'] (1.0)
+              ['c', 'a', 'r'] (1.0)
+                car (1.0)
+        """
+        if self.is_empty() or self.is_leaf():
+            return None
+        depth = len(self.value)
+        if len(prefix) <= depth:
+            if self.value[:len(prefix)] == list(prefix):
+                self._clear()
+            return None
+        if self.value != list(prefix[:depth]):
             return None
-        else:
-            if self.value == last.value[:len(self.value)]:
-                self.size -= removed_size
-                self._weight_sum -= weight_sum
-                if self.size <= 0:
-                    self.weight = 0
-                else:
-                    if self._weight_type == 'average':
-                        self.weight = self._weight_sum / self.size
-                    else:
-                        self.weight = self._weight_sum
-                if self.value == last.value:
-                    i = 0
-                    while i < len(self.subtrees):
-                        if self.subtrees[i].value == prefix[:len(self.subtrees[i].value)]:
-                            self.subtrees = self.subtrees[:i] + \
-                                            self.subtrees[i+1:]
-                        else:
-                            i += 1
-                else:
-                    for subtree in self.subtrees:
-                        subtree._change_all_weights(prefix, last, weight_sum, removed_size)
+
+        path = [self]
+        for symbol in prefix[depth:]:
+            child = path[-1]._child(symbol)
+            if child is None:
+                return None
+            path.append(child)
+
+        # Detach the tree for <prefix>, and every ancestor it leaves empty.
+        removed = path.pop()
+        size = removed.size
+        weight_sum = removed._weight_sum
+        while True:
+            parent = path[-1]
+            parent._detach(removed, prefix[depth + len(path) - 1])
+            if parent.subtrees or len(path) == 1:
+                break
+            removed = path.pop()
+
+        child = None
+        for tree in reversed(path):
+            old_weight = tree.weight
+            tree.size -= size
+            tree._weight_sum -= weight_sum
+            if tree.size == 0:
+                tree._weight_sum = 0
+                tree.weight = 0
+            elif tree._weight_type == 'average':
+                tree.weight = tree._weight_sum / tree.size
+            else:
+                tree.weight = tree._weight_sum
+            tree._max_weight = max((subtree._max_weight
+                                    for subtree in tree.subtrees), default=0)
+            if child is not None:
+                tree.subtrees.reweigh(child, child_weight)
+            child, child_weight = tree, old_weight
+        return None
+
+    def _clear(self) -> None:
+        """Remove every value in this tree, keeping its common prefix."""
+        self.subtrees = _SubtreeList()
+        self.size = 0
+        self._weight_sum = 0
+        self.weight = 0
+        self._max_weight = 0
+        if self._children:
+            self._children = {}
+
+    def _detach(self, subtree: SimplePrefixTree, symbol: Any) -> None:
+        """Remove <subtree>, the internal subtree indexed under <symbol>,
+        from this tree's subtrees and child index.
+        """
+        self.subtrees.discard(subtree)
+        if self._children:
+            self._children.pop(symbol, None)
 
 
 def new_subtree(value: Any, weight: float, weight_type: str) -> \
@@ -348,10 +813,642 @@ def new_subtree(value: Any, weight: float, weight_type: str) -> \
     subtree = SimplePrefixTree(weight_type)
     subtree.value = value
     subtree.weight = weight
+    subtree._max_weight = weight
     subtree.size = 1
     return subtree
 
 
+def _top_k(tree: Any, limit: Optional[int],
+           stats: Optional[TreeStats] = None) -> List[Tuple[Any, float]]:
+    """Return up to <limit> (value, weight) pairs for the leaves of <tree>,
+    in non-increasing order of weight, or every pair if limit is None.
+
+    <tree> is a prefix tree whose subtrees each have a _max_weight. Trees are
+    expanded best-first by _max_weight, so only trees that could still hold
+    one of the top <limit> values are visited.
+
+    If <stats> is given, the trees visited and the heap entries created are
+    added to it.
+    """
+    if limit is None:
+        leaves = []
+        stack = [tree]
+        visited = 0
+        while stack:
+            subtree = stack.pop()
+            if subtree.subtrees:
+                stack.extend(subtree.subtrees)
+                visited += 1
+            else:
+                leaves.append((subtree.value, subtree.weight))
+        leaves.sort(key=lambda pair: pair[1], reverse=True)
+        if stats is not None:
+            stats.nodes_visited += visited + len(leaves)
+        return leaves
+
+    lst = []
+    heap = [(-tree._max_weight, 0, tree)]
+    count = 1
+    while heap and len(lst) < limit:
+        subtree = heapq.heappop(heap)[2]
+        if subtree.subtrees:
+            for child in subtree.subtrees:
+                heapq.heappush(heap, (-child._max_weight, count, child))
+                count += 1
+        else:
+            lst.append((subtree.value, subtree.weight))
+    if stats is not None:
+        stats.nodes_visited += count - len(heap)
+        stats.allocations += count
+    return lst
+
+
+def _common_prefix(tree: Any) -> Tuple[Sequence, int]:
+    """Return a sequence <s> and a length <n> such that s[:n] is the common
+    prefix of <tree>, an internal prefix tree.
+
+    Trees that share prefix sequences store theirs as the first _depth
+    elements of _source; the others store it as their value.
+    """
+    depth = getattr(tree, '_depth', None)
+    if depth is None:
+        return tree.value, len(tree.value)
+    return tree._source, depth
+
+
+def _edit_rows(row: List[int], query: Sequence, symbols: Sequence,
+               max_edits: int) -> Tuple[bool, Optional[List[int]]]:
+    """Extend the Levenshtein row <row> of a sequence against <query> by each
+    element of <symbols> in turn.
+
+    row[j] is the edit distance between the sequence so far and query[:j].
+    Return (True, None) as soon as the whole query is within <max_edits> of
+    the sequence so far, so that everything below it matches; (False, None)
+    as soon as every entry exceeds <max_edits>, so that nothing below it
+    can; and otherwise (False, the last row).
+
+    >>> _edit_rows([0, 1, 2, 3], 'cat', 'c', 1)
+    (False, [1, 0, 1, 2])
+    >>> _edit_rows([0, 1, 2, 3], 'cat', 'ca', 1)
+    (True, None)
+    >>> _edit_rows([0, 1, 2, 3], 'cat', 'xy', 1)
+    (False, None)
+    """
+    for symbol in symbols:
+        previous = row
+        row = [previous[0] + 1]
+        for j, element in enumerate(query):
+            row.append(min(previous[j + 1] + 1, row[j] + 1,
+                           previous[j] + (element != symbol)))
+        if row[-1] <= max_edits:
+            return True, None
+        if min(row) > max_edits:
+            return False, None
+    return False, row
+
+
+def _fuzzy_top_k(tree: Any, prefix: List, max_edits: int,
+                 limit: Optional[int], stats: Optional[TreeStats] = None
+                 ) -> List[Tuple[Any, float]]:
+    """Return up to <limit> (value, weight) pairs for the leaves of <tree>
+    whose prefix sequence starts within <max_edits> edits of <prefix>, in
+    non-increasing order of weight, or every such pair if limit is None.
+
+    <tree> is the root of a prefix tree whose subtrees each have a
+    _max_weight. Trees are expanded best-first by _max_weight, as in _top_k,
+    carrying the Levenshtein row of their common prefix against <prefix>.
+    A tree whose row shows that it matches has every value below it match,
+    and a tree whose row exceeds <max_edits> everywhere is dropped along
+    with its subtrees, so the trees visited depend on <limit> and on how
+    many trees are near <prefix>, not on the size of the tree.
+
+    If <stats> is given, the trees visited, the prefix elements compared and
+    the heap entries created are added to it.
+    """
+    if not tree.subtrees:
+        return []
+    query = list(prefix)
+    sequence, depth = _common_prefix(tree)
+    row = list(range(len(query) + 1))
+    matched = row[-1] <= max_edits
+    if not matched:
+        matched, row = _edit_rows(row, query, sequence[:depth], max_edits)
+        if not matched and row is None:
+            return []
+    compared = depth
+
+    lst = []
+    # Entries (-_max_weight, tiebreak, tree, depth of its common prefix, its
+    # row, or None if every value below it matches).
+    heap = [(-tree._max_weight, 0, tree, depth, None if matched else row)]
+    count = 1
+    while heap and (limit is None or len(lst) < limit):
+        _, _, subtree, depth, row = heapq.heappop(heap)
+        if not subtree.subtrees:
+            lst.append((subtree.value, subtree.weight))
+            continue
+        for child in subtree.subtrees:
+            if row is None:
+                heapq.heappush(heap, (-child._max_weight, count, child, 0,
+                                      None))
+                count += 1
+            elif child.subtrees:
+                # The leaves of a tree that does not match cannot match.
+                sequence, child_depth = _common_prefix(child)
+                matched, child_row = _edit_rows(
+                    row, query, sequence[depth:child_depth], max_edits)
+                compared += child_depth - depth
+                if matched or child_row is not None:
+                    heapq.heappush(heap, (-child._max_weight, count, child,
+                                          child_depth, child_row))
+                    count += 1
+    if stats is not None:
+        stats.nodes_visited += count - len(heap)
+        stats.comparisons += compared
+        stats.allocations += count
+    return lst
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Suspend the cyclic garbage collector for the duration of the block.
+
+    Prefix trees contain no reference cycles, but creating one tree object
+    per node makes the collector rescan every live tree object many times
+    during a large build.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _aggregate(items: Iterable[Tuple[Any, float, List]]
+               ) -> List[Tuple[Tuple, Any, float]]:
+    """Return the (prefix, value, weight) triples for the (value, weight,
+    prefix) triples in <items>, with the weights of repeated values summed and
+    the result sorted by prefix.
+    """
+    totals = {}
+    for value, weight, prefix in items:
+        entry = totals.get(value)
+        if entry is None:
+            totals[value] = [weight, prefix]
+        else:
+            entry[0] += weight
+    entries = [(tuple(prefix), value, weight)
+               for value, (weight, prefix) in totals.items()]
+    entries.sort(key=itemgetter(0))
+    return entries
+
+
+def _common_length(prefix1: Tuple, prefix2: Tuple) -> int:
+    """Return the length of the longest common prefix of the two given
+    sequences.
+    """
+    n = min(len(prefix1), len(prefix2))
+    i = 0
+    while i < n and prefix1[i] == prefix2[i]:
+        i += 1
+    return i
+
+
+def _recount(tree: Any) -> None:
+    """Recompute the size and weights of <tree>, a non-leaf prefix tree,
+    from its subtrees, and sort its subtrees in non-increasing order of
+    weight.
+    """
+    size = 0
+    weight_sum = 0
+    max_weight = 0
+    for subtree in tree.subtrees:
+        if subtree.subtrees:
+            size += subtree.size
+            weight_sum += subtree._weight_sum
+        else:
+            size += 1
+            weight_sum += subtree.weight
+        if subtree._max_weight > max_weight:
+            max_weight = subtree._max_weight
+    tree.size = size
+    tree._weight_sum = weight_sum
+    tree._max_weight = max_weight
+    if size == 0:
+        tree.weight = 0
+    elif tree._weight_type == 'average':
+        tree.weight = weight_sum / size
+    else:
+        tree.weight = weight_sum
+    tree.subtrees.sort(key=attrgetter('weight'), reverse=True)
+
+
+def _memory_stats(root: Any) -> Dict[str, Any]:
+    """Return the memory_stats of the prefix tree <root>.
+
+    <root> is a SimplePrefixTree, a CompressedPrefixTree, or a tree of one of
+    their subclasses. The common prefix of an internal tree is either its
+    value, or for the trees that share prefix sequences, the first _depth
+    elements of _source; each shared sequence is counted once.
+    """
+    components = dict.fromkeys(['trees', 'subtree_lists', 'child_indexes',
+                                'prefixes', 'caches', 'values'], 0)
+    leaves = internal = compressible = prefix_elements = 0
+    simple_trees = 0
+    depths = {}
+    fan_out = {}
+    seen = set()
+
+    # Each tree, with the number of trees above it and the length of the
+    # common prefix of its parent (-1 for the root, whose empty prefix would
+    # be a tree of its own in a SimplePrefixTree).
+    stack = [(root, 0, -1)]
+    while stack:
+        tree, level, above = stack.pop()
+        components['trees'] += sys.getsizeof(tree)
+        components['subtree_lists'] += sys.getsizeof(tree.subtrees)
+        children = tree._children
+        if children is not None:
+            components['child_indexes'] += sys.getsizeof(children)
+        top = getattr(tree, '_top', None)
+        if top is not None:
+            components['caches'] += sys.getsizeof(top)
+            for entry in top:
+                if id(entry) not in seen:
+                    seen.add(id(entry))
+                    components['caches'] += sys.getsizeof(entry)
+        if not tree.subtrees:
+            if tree.weight > 0:
+                leaves += 1
+                simple_trees += 1
+                depths[level] = depths.get(level, 0) + 1
+                components['values'] += sys.getsizeof(tree.value)
+            continue
+
+        internal += 1
+        fan_out[len(tree.subtrees)] = fan_out.get(len(tree.subtrees), 0) + 1
+        if len(tree.subtrees) == 1 and tree.subtrees[0].subtrees:
+            compressible += 1
+        prefix, depth = _common_prefix(tree)
+        if id(prefix) not in seen:
+            seen.add(id(prefix))
+            prefix_elements += len(prefix)
+            components['prefixes'] += sys.getsizeof(prefix)
+        simple_trees += depth - above
+        stack.extend((subtree, level + 1, depth) for subtree in tree.subtrees)
+
+    components['total'] = sum(components.values())
+    trees = leaves + internal
+    return {
+        'leaves': leaves,
+        'internal': internal,
+        'compressible': compressible,
+        'prefix_elements': prefix_elements,
+        'bytes': components,
+        'depth_histogram': dict(sorted(depths.items())),
+        'fan_out': dict(sorted(fan_out.items())),
+        'compression_ratio': simple_trees / trees if trees else 1.0
+    }
+
+
+def _get_shared_value(tree: Any) -> Any:
+    """Return the value of <tree>, a tree storing its common prefix as the
+    first _depth elements of a shared _source sequence.
+    """
+    if tree._depth is None:
+        return tree._source
+    return list(tree._source[:tree._depth])
+
+
+def _set_shared_value(tree: Any, value: Any) -> None:
+    """Store <value> as the value of <tree>, a tree storing its common prefix
+    as the first _depth elements of a shared _source sequence.
+    """
+    tree._source = value
+    tree._depth = None
+
+
+# The number of subtrees a CompactPrefixTree scans before it builds a dict
+# index of its children.
+_INDEX_THRESHOLD = 8
+
+
+class CompactPrefixTree(SimplePrefixTree):
+    """A simple prefix tree whose internal values are not stored as lists.
+
+    This tree has the same shape, weights and autocomplete results as a
+    SimplePrefixTree built from the same insertions. The difference is that
+    an internal tree no longer owns a list holding its whole common prefix:
+    it keeps a reference to the prefix sequence of the insertion that created
+    it, shared with every other tree created by that insertion, together
+    with its depth. Its common prefix is rebuilt only when self.value is read.
+
+    For a value whose prefix sequence has length L, this stores O(L) prefix
+    elements instead of the O(L^2) stored by a SimplePrefixTree.
+
+    === Private Attributes ===
+    _source:
+        For a leaf, the value stored in the leaf. For an internal tree, a
+        tuple whose first _depth elements are this tree's common prefix.
+    _depth:
+        The length of this tree's common prefix, or None if _source is
+        itself the value of this tree.
+    _children:
+        As in SimplePrefixTree, but None until this tree has more than
+        _INDEX_THRESHOLD subtrees; smaller trees are scanned instead, which
+        keeps the long single-child chains of a prefix tree free of dicts.
+    """
+    _source: Any
+    _depth: Optional[int]
+
+    __slots__ = ('_source', '_depth')
+
+    def __init__(self, weight_type: str) -> None:
+        """Initialize an empty compact prefix tree.
+
+        Precondition: weight_type == 'sum' or weight_type == 'average'.
+        """
+        SimplePrefixTree.__init__(self, weight_type)
+        self._children = None
+
+    value = property(_get_shared_value, _set_shared_value)
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Insert the given value into this Autocompleter.
+
+        See SimplePrefixTree.insert.
+        """
+        # Convert once, so that every tree created by this insertion can
+        # share the same immutable prefix sequence.
+        self._insert(value, weight, tuple(prefix), 0)
+
+    def _child(self, symbol: Any) -> Optional[SimplePrefixTree]:
+        """Return the internal subtree whose common prefix extends this tree's
+        by <symbol>, or None if there is no such subtree.
+        """
+        # Compact trees are only built through insert, so the index is always
+        # complete once it exists.
+        if self._children is not None:
+            return self._children.get(symbol)
+        for subtree in self.subtrees:
+            if subtree._depth is not None and \
+                    subtree._source[subtree._depth - 1] == symbol:
+                return subtree
+        return None
+
+    def _index_subtree(self, subtree: SimplePrefixTree, symbol: Any) -> None:
+        """Record <subtree>, which is already in self.subtrees, in
+        self._children under <symbol> (if it is not None).
+        """
+        if self._children is not None:
+            SimplePrefixTree._index_subtree(self, subtree, symbol)
+        elif len(self.subtrees) > _INDEX_THRESHOLD:
+            self._children = {s._source[s._depth - 1]: s
+                              for s in self.subtrees
+                              if s._depth is not None}
+
+    def _new_leaf(self, value: Any, weight: float) -> CompactPrefixTree:
+        """Return a new leaf storing <value> with the given weight."""
+        leaf = CompactPrefixTree(self._weight_type)
+        leaf._source = value
+        leaf.weight = weight
+        leaf._max_weight = weight
+        leaf.size = 1
+        return leaf
+
+    def _new_internal(self, prefix: Tuple, depth: int,
+                      weight: float) -> CompactPrefixTree:
+        """Return a new internal tree for the common prefix prefix[:depth],
+        holding a single value of the given weight.
+        """
+        subtree = CompactPrefixTree(self._weight_type)
+        subtree._source = prefix
+        subtree._depth = depth
+        subtree.weight = weight
+        subtree._weight_sum = weight
+        subtree._max_weight = weight
+        subtree.size = 1
+        return subtree
+
+
+################################################################################
+# CachedPrefixTree
+################################################################################
+# The number of suggestions each CachedPrefixTree keeps by default.
+_DEFAULT_CACHE_SIZE = 10
+
+
+def _offer(top: List[Tuple[Any, float]], entry: Tuple[Any, float],
+           limit: int) -> None:
+    """Update <top>, a list of at most <limit> (value, weight) pairs in
+    non-increasing order of weight, for the value in <entry> now having the
+    weight in <entry>.
+
+    Precondition: the weight of the value has not decreased.
+    """
+    value, weight = entry
+    for i in range(len(top)):
+        if top[i][0] == value:
+            del top[i]
+            break
+    i = len(top)
+    while i > 0 and top[i - 1][1] < weight:
+        i -= 1
+    if i < limit:
+        top.insert(i, entry)
+        del top[limit:]
+
+
+class CachedPrefixTree(SimplePrefixTree):
+    """A simple prefix tree in which each internal tree keeps a list of its
+    values with the largest weights.
+
+    autocomplete with a limit of at most the cache size is answered by
+    descending to the tree for the prefix and slicing its list. insert and
+    remove only update the lists of the trees along the given prefix.
+
+    === Private Attributes ===
+    _top:
+        For an internal tree, up to _cache_size (value, weight) pairs for
+        the values in this tree with the largest weights, in non-increasing
+        order of weight. The pair for a value is shared by every list it is
+        in. For a leaf, an empty list.
+    _cache_size:
+        The number of pairs kept in each _top list. Only the value of the
+        tree that operations are called on is used.
+    _cache_seconds:
+        The time spent by insert and remove maintaining the _top lists of
+        this tree.
+    """
+    _top: List[Tuple[Any, float]]
+    _cache_size: int
+    _cache_seconds: float
+
+    __slots__ = ('_top', '_cache_size', '_cache_seconds')
+
+    def __init__(self, weight_type: str,
+                 cache_size: int = _DEFAULT_CACHE_SIZE) -> None:
+        """Initialize an empty prefix tree that caches the top <cache_size>
+        values of each internal tree.
+
+        Preconditions:
+            weight_type == 'sum' or weight_type == 'average'
+            cache_size > 0
+        """
+        SimplePrefixTree.__init__(self, weight_type)
+        self._top = []
+        self._cache_size = cache_size
+        self._cache_seconds = 0.0
+
+    @classmethod
+    def from_items(cls, weight_type: str,
+                   items: Iterable[Tuple[Any, float, List]],
+                   cache_size: int = _DEFAULT_CACHE_SIZE
+                   ) -> CachedPrefixTree:
+        """Return a new tree storing every value in <items>, caching the top
+        <cache_size> values of each internal tree.
+
+        See SimplePrefixTree.from_items.
+
+        >>> tree = CachedPrefixTree.from_items('sum', [
+        ...     ('cat', 1, ['c', 'a', 't']), ('car', 3, ['c', 'a', 'r']),
+        ...     ('dog', 2, ['d', 'o', 'g'])], 2)
+        >>> tree.autocomplete([], 2)
+        [('car', 3), ('dog', 2)]
+        """
+        tree = super().from_items(weight_type, items)
+        tree._cache_size = cache_size
+        start = time.perf_counter()
+        # Fill the lists bottom-up, so each tree's subtrees are done first.
+        internal = [tree]
+        for subtree in internal:
+            internal.extend(child for child in subtree.subtrees
+                            if child.subtrees)
+        for subtree in reversed(internal):
+            subtree._refill(cache_size)
+        tree._cache_seconds = time.perf_counter() - start
+        return tree
+
+    def _insert(self, value: Any, weight: float, prefix: List,
+                depth: int, stats: Optional[TreeStats] = None) -> bool:
+        """Insert <value> into this tree, whose common prefix is
+        prefix[:depth], and update the _top lists along <prefix>.
+
+        Return True if a new leaf was created, or False if <weight> was added
+        to a leaf that already stored <value>. If <stats> is given, the work
+        done is added to it.
+        """
+        is_new = SimplePrefixTree._insert(self, value, weight, prefix, depth,
+                                          stats)
+        start = time.perf_counter()
+        path = [self]
+        for symbol in prefix[depth:]:
+            path.append(path[-1]._child(symbol))
+        for leaf in path[-1].subtrees:
+            if leaf.is_leaf() and leaf.value == value:
+                entry = (value, leaf.weight)
+                break
+        for tree in path:
+            _offer(tree._top, entry, self._cache_size)
+        self._cache_seconds += time.perf_counter() - start
+        return is_new
+
+    def remove(self, prefix: List) -> None:
+        """Remove all values that match the given prefix.
+        """
+        SimplePrefixTree.remove(self, prefix)
+        start = time.perf_counter()
+        path = [self]
+        for symbol in prefix:
+            child = path[-1]._child(symbol)
+            if child is None:
+                break
+            path.append(child)
+        for tree in reversed(path):
+            tree._refill(self._cache_size)
+        self._cache_seconds += time.perf_counter() - start
+
+    def _refill(self, cache_size: int) -> None:
+        """Recompute the _top list of this internal tree from the lists of
+        its subtrees.
+        """
+        entries = []
+        for subtree in self.subtrees:
+            if subtree.subtrees:
+                entries.extend(subtree._top)
+            else:
+                entries.append((subtree.value, subtree.weight))
+        self._top = heapq.nlargest(cache_size, entries, key=itemgetter(1))
+
+    def _new_leaf(self, value: Any, weight: float) -> CachedPrefixTree:
+        """Return a new leaf storing <value> with the given weight."""
+        leaf = CachedPrefixTree(self._weight_type)
+        leaf.value = value
+        leaf.weight = weight
+        leaf._max_weight = weight
+        leaf.size = 1
+        return leaf
+
+    def _new_internal(self, prefix: List, depth: int,
+                      weight: float) -> CachedPrefixTree:
+        """Return a new internal tree for the common prefix prefix[:depth],
+        holding a single value of the given weight.
+        """
+        subtree = self._new_leaf(list(prefix[:depth]), weight)
+        subtree._weight_sum = weight
+        return subtree
+
+    def _suggest(self, tree: SimplePrefixTree, limit: Optional[int],
+                 stats: Optional[TreeStats] = None
+                 ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> of the values in <tree>, a tree below this
+        one, in non-increasing order of weight.
+
+        A limit of at most the cache size is answered from the _top list of
+        <tree>. If <stats> is given, the work done is added to it.
+        """
+        if limit is not None and limit <= self._cache_size:
+            if stats is not None:
+                stats.nodes_visited += 1
+                stats.allocations += 1
+            return tree._top[:limit]
+        return _top_k(tree, limit, stats)
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Return the cost of the _top lists of this tree.
+
+        The keys are 'cache_size', 'lists' (the number of internal trees),
+        'entries' (the total length of their lists), 'bytes' (the approximate
+        memory used by the lists and the pairs in them) and 'seconds' (the
+        time insert, remove and from_items have spent maintaining them).
+        """
+        lists = 0
+        entries = 0
+        size = 0
+        pairs = set()
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            if tree.subtrees:
+                lists += 1
+                entries += len(tree._top)
+                size += sys.getsizeof(tree._top)
+                for entry in tree._top:
+                    if id(entry) not in pairs:
+                        pairs.add(id(entry))
+                        size += sys.getsizeof(entry)
+                stack.extend(tree.subtrees)
+        return {
+            'cache_size': self._cache_size,
+            'lists': lists,
+            'entries': entries,
+            'bytes': size,
+            'seconds': self._cache_seconds
+        }
+
+
 ################################################################################
 # CompressedPrefixTree (Task 6)
 ################################################################################
@@ -374,6 +1471,28 @@ class CompressedPrefixTree(Autocompleter):
         of the leaf weights in this tree.
     subtrees:
         A list of subtrees of this prefix tree.
+    size: the number of values stored in this tree
+
+    === Private Attributes ===
+    _weight_sum:
+        The sum of the weights of the leaves in this tree.
+    _weight_type:
+        The type of accumulated weight being used for internal values in this
+        tree.
+    _children:
+        The internal subtrees of this tree, keyed by the first element of
+        their edge from this tree, or None if this tree is a leaf.
+    _max_weight:
+        The largest weight of a leaf in this tree, or 0 if this tree is empty.
+    _source:
+        For a leaf, the value stored in the leaf. For an internal tree, a
+        tuple whose first _depth elements are this tree's common prefix. The
+        tuple is shared with the other trees created by the same insertion,
+        so the edge into this tree is the slice of _source between its
+        parent's _depth and its own, rather than a list of its own.
+    _depth:
+        The length of this tree's common prefix, or None if _source is
+        itself the value of this tree.
 
     === Representation invariants ===
     - self.weight >= 0
@@ -401,7 +1520,1321 @@ class CompressedPrefixTree(Autocompleter):
     """
     value: Optional[Any]
     weight: float
-    subtrees: List[CompressedPrefixTree]
+    subtrees: _SubtreeList
+    size: int
+    _weight_sum: float
+    _weight_type: str
+    _children: Optional[Dict[Any, CompressedPrefixTree]]
+    _max_weight: float
+    _source: Any
+    _depth: Optional[int]
+
+    __slots__ = ('weight', 'subtrees', 'size', '_weight_sum', '_weight_type',
+                 '_children', '_max_weight', '_source', '_depth')
+
+    value = property(_get_shared_value, _set_shared_value)
+
+    def __init__(self, weight_type: str) -> None:
+        """Initialize an empty compressed prefix tree.
+
+        Precondition: weight_type == 'sum' or weight_type == 'average'.
+
+        The given <weight_type> value specifies how the aggregate weight
+        of non-leaf trees should be calculated (see the assignment handout
+        for details).
+        """
+        self._weight_type = weight_type
+        self.weight = 0
+        self._weight_sum = 0
+        self._max_weight = 0
+        self.value = []
+        self.subtrees = _SubtreeList()
+        self.size = 0
+        self._children = {}
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return self.size
+
+    @classmethod
+    def from_items(cls, weight_type: str,
+                   items: Iterable[Tuple[Any, float, List]]
+                   ) -> CompressedPrefixTree:
+        """Return a new compressed tree storing every value in <items>.
+
+        See SimplePrefixTree.from_items. Walking the triples in prefix order,
+        a tree is created only where a prefix ends or where a later prefix
+        branches off the path of the previous one, so no tree is ever split
+        or merged.
+
+        >>> tree = CompressedPrefixTree.from_items('sum', [
+        ...     ('cat', 1, ['c', 'a', 't']), ('car', 3, ['c', 'a', 'r']),
+        ...     ('cat', 1, ['c', 'a', 't'])])
+        >>> tree.value, len(tree.subtrees)
+        (['c', 'a'], 2)
+        >>> tree.autocomplete(['c', 'a'])
+        [('car', 3), ('cat', 2)]
+        """
+        path = []
+        with _gc_paused():
+            previous = ()
+            for prefix, value, weight in _aggregate(items):
+                depth = _common_length(previous, prefix)
+                lower = None
+                while path and path[-1]._depth > depth:
+                    lower = path.pop()
+                    _recount(lower)
+                if lower is not None and (not path or path[-1]._depth < depth):
+                    # <prefix> branches off in the middle of the edge into
+                    # <lower>, so that edge needs a new tree at the branch
+                    # point.
+                    middle = cls(weight_type)
+                    middle._source = lower._source
+                    middle._depth = depth
+                    middle.subtrees.append(lower)
+                    middle._children[lower._source[depth]] = lower
+                    if path:
+                        parent = path[-1]
+                        parent.subtrees[-1] = middle
+                        parent._children[lower._source[parent._depth]] = middle
+                    path.append(middle)
+                if path and path[-1]._depth == len(prefix):
+                    path[-1].subtrees.append(path[-1]._new_leaf(value, weight))
+                else:
+                    subtree = cls(weight_type)
+                    subtree._source = prefix
+                    subtree._depth = len(prefix)
+                    subtree.subtrees.append(subtree._new_leaf(value, weight))
+                    if path:
+                        path[-1].subtrees.append(subtree)
+                        path[-1]._children[prefix[path[-1]._depth]] = subtree
+                    path.append(subtree)
+                previous = prefix
+        if not path:
+            return cls(weight_type)
+        for tree in reversed(path):
+            _recount(tree)
+        return path[0]
+
+    def is_empty(self) -> bool:
+        """Return whether this compressed prefix tree is empty."""
+        return self.size == 0
+
+    def is_leaf(self) -> bool:
+        """Return whether this compressed prefix tree is a leaf."""
+        return self.weight > 0 and self.subtrees == []
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by this tree.
+
+        See Autocompleter.memory_stats.
+
+        >>> tree = CompressedPrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> stats = tree.memory_stats()
+        >>> stats['leaves'], stats['internal'], stats['compressible']
+        (2, 3, 0)
+        >>> stats['compression_ratio']
+        1.4
+        """
+        return _memory_stats(self)
+
+    def __str__(self) -> str:
+        """Return a string representation of this tree.
+
+        You may find this method helpful for debugging.
+        """
+        if self.is_empty():
+            return ''
+        lines = []
+        stack = [(self, 0)]
+        while stack:
+            tree, depth = stack.pop()
+            lines.append('  ' * depth + f'{tree.value} ({tree.weight})\n')
+            stack.extend((subtree, depth + 1)
+                         for subtree in reversed(tree.subtrees))
+        return ''.join(lines)
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Insert the given value into this Autocompleter.
+
+        The value is inserted with the given weight, and is associated with
+        the prefix sequence <prefix>.
+
+        If the value has already been inserted into this prefix tree
+        (compare values using ==), then the given weight should be *added* to
+        the existing weight of this value.
+
+        Preconditions:
+            weight > 0
+            The given value is either:
+                1) not in this Autocompleter
+                2) was previously inserted with the SAME prefix sequence
+
+        >>> tree = CompressedPrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> print(tree, end='')
+        [] (7.0)
+          ['d', 'o', 'g'] (4.0)
+            dog (4.0)
+          ['c', 'a'] (3.0)
+            ['c', 'a', 't'] (2.0)
+              cat (2.0)
+            ['c', 'a', 'r'] (1.0)
+              car (1.0)
+        """
+        # Convert once, so that every tree created by this insertion can
+        # share the same immutable prefix sequence.
+        self._insert(value, weight, tuple(prefix))
+
+    def _insert(self, value: Any, weight: float, prefix: Tuple,
+                stats: Optional[TreeStats] = None) -> None:
+        """Insert <value> with the given weight and prefix sequence into this
+        tree, which is the whole tree.
+
+        If <stats> is given, the work done is added to it.
+        """
+        if self.is_empty():
+            self._source = prefix
+            self._depth = len(prefix)
+            self._add_subtree(self._new_leaf(value, weight))
+            self._add_weight(weight, 1, weight)
+            if stats is not None:
+                stats.nodes_visited += 1
+                stats.allocations += 1
+            return None
+
+        path = []
+        tree = self
+        depth = 0
+        # The trees created: a new leaf, a new internal tree above it, and
+        # the lower half of a split tree.
+        created = 0
+        while True:
+            # The first element of this tree's edge has already been matched
+            # by the lookup in its parent's _children.
+            end = min(tree._depth, len(prefix))
+            while depth < end and tree._source[depth] == prefix[depth]:
+                depth += 1
+            if depth < tree._depth:
+                tree._split(depth)
+                created = 1
+            path.append(tree)
+            if depth == len(prefix):
+                leaf, count = tree._add_to_leaf(value, weight)
+                break
+            child = tree._children.get(prefix[depth])
+            if child is None:
+                subtree = self._new_internal(value, weight, prefix)
+                tree._add_subtree(subtree, prefix[depth])
+                leaf = subtree.subtrees[0]
+                count = 1
+                created += 2
+                break
+            tree = child
+            depth += 1
+
+        parent = None
+        for tree in path:
+            old_weight = tree.weight
+            tree._add_weight(weight, count, leaf.weight)
+            if parent is not None:
+                parent.subtrees.reweigh(tree, old_weight)
+            parent = tree
+        if stats is not None:
+            stats.nodes_visited += len(path)
+            # The elements matched, and the subtrees scanned for a leaf
+            # storing <value> if the whole prefix matched.
+            stats.comparisons += depth + \
+                (len(path[-1].subtrees) if depth == len(prefix) else 0)
+            stats.allocations += created + (count and depth == len(prefix))
+        return None
+
+    def _add_to_leaf(self, value: Any, weight: float
+                     ) -> Tuple[CompressedPrefixTree, int]:
+        """Add <weight> to the leaf of this tree storing <value>, or add a
+        new leaf for <value> if there is none. Return that leaf, and 1 if
+        it is new or 0 otherwise.
+
+        This tree's own size and weight are left to the caller.
+        """
+        for subtree in self.subtrees:
+            if subtree.is_leaf() and subtree.value == value:
+                old_weight = subtree.weight
+                subtree.weight += weight
+                subtree._max_weight = subtree.weight
+                self.subtrees.reweigh(subtree, old_weight)
+                return subtree, 0
+        leaf = self._new_leaf(value, weight)
+        self._add_subtree(leaf)
+        return leaf, 1
+
+    def _add_weight(self, weight: float, count: int,
+                    leaf_weight: float) -> None:
+        """Account for <count> new values below this tree, and for <weight>
+        added to the values below it, leaving a leaf of weight <leaf_weight>.
+        """
+        self.size += count
+        self._weight_sum += weight
+        if self._weight_type == 'average':
+            self.weight = self._weight_sum / self.size
+        else:
+            self.weight = self._weight_sum
+        self._max_weight = max(self._max_weight, leaf_weight)
+
+    def _add_subtree(self, subtree: CompressedPrefixTree,
+                     symbol: Any = None) -> None:
+        """Insert <subtree> into self.subtrees, keeping the list sorted in
+        non-increasing order of weight.
+
+        If <subtree> is an internal tree, <symbol> is the first element of
+        its edge from this tree, and is used to index it in self._children.
+        """
+        self.subtrees.add(subtree)
+        if symbol is not None:
+            self._children[symbol] = subtree
+
+    def _split(self, depth: int) -> None:
+        """Shorten this tree's common prefix to its first <depth> elements.
+
+        The contents of this tree move to a new subtree, which becomes this
+        tree's only subtree. This tree keeps its identity, so the tree above
+        it is left untouched.
+        """
+        lower = CompressedPrefixTree(self._weight_type)
+        lower._source = self._source
+        lower._depth = self._depth
+        lower.subtrees = self.subtrees
+        lower._children = self._children
+        lower.size = self.size
+        lower._weight_sum = self._weight_sum
+        lower.weight = self.weight
+        lower._max_weight = self._max_weight
+        self._depth = depth
+        self.subtrees = _SubtreeList([lower])
+        self._children = {lower._source[depth]: lower}
+
+    def _merge(self) -> None:
+        """Absorb the only subtree of this tree, which is not a leaf.
+
+        This removes a compressible internal value. The weights are already
+        those of the subtree, since it holds every value below this tree.
+        """
+        lower = self.subtrees[0]
+        self._source = lower._source
+        self._depth = lower._depth
+        self.subtrees = lower.subtrees
+        self._children = lower._children
+
+    def _new_leaf(self, value: Any, weight: float) -> CompressedPrefixTree:
+        """Return a new leaf storing <value> with the given weight."""
+        leaf = CompressedPrefixTree(self._weight_type)
+        leaf.value = value
+        leaf.weight = weight
+        leaf._max_weight = weight
+        leaf.size = 1
+        leaf._children = None
+        return leaf
+
+    def _new_internal(self, value: Any, weight: float,
+                      prefix: Tuple) -> CompressedPrefixTree:
+        """Return a new internal tree for the common prefix <prefix>, holding
+        only a leaf storing <value> with the given weight.
+        """
+        subtree = CompressedPrefixTree(self._weight_type)
+        subtree._source = prefix
+        subtree._depth = len(prefix)
+        subtree.subtrees.append(self._new_leaf(value, weight))
+        subtree._add_weight(weight, 1, weight)
+        return subtree
+
+    def autocomplete(self, prefix: List,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        ordered in non-increasing weight. (You can decide how to break ties.)
+
+        If limit is None, return *every* match for the given prefix.
+
+        Precondition: limit is None or limit > 0.
+        """
+        tree = self._descend(prefix)
+        if tree is None:
+            return []
+        return self._suggest(tree, limit)
+
+    def _suggest(self, tree: CompressedPrefixTree, limit: Optional[int],
+                 stats: Optional[TreeStats] = None
+                 ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> of the values in <tree>, a tree below this
+        one, in non-increasing order of weight.
+
+        If <stats> is given, the work done is added to it.
+        """
+        return _top_k(tree, limit, stats)
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        See Autocompleter.autocomplete_fuzzy.
+        """
+        return _fuzzy_top_k(self, prefix, max_edits, limit)
+
+    def _descend(self, prefix: List, stats: Optional[TreeStats] = None
+                 ) -> Optional[CompressedPrefixTree]:
+        """Return the highest tree whose values all match <prefix>, or None
+        if no value in this tree matches <prefix>.
+
+        If <stats> is given, the work done is added to it.
+        """
+        return self._find(tuple(prefix), stats)[0]
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order.
+
+        The distinct prefixes are sorted, and each one is looked up starting
+        from the deepest tree whose whole common prefix it shares with the
+        one before it.
+
+        Preconditions:
+            limit is None or limit > 0
+            the elements of the prefixes can be compared with each other
+        """
+        if self.is_empty():
+            return [[] for _ in prefixes]
+        results = {}
+        # The trees along previous, each with a common prefix of previous.
+        path = []
+        previous = ()
+        for key in sorted({tuple(prefix) for prefix in prefixes}):
+            depth = _common_length(previous, key)
+            while path and path[-1]._depth > depth:
+                path.pop()
+            start = path.pop() if path else self
+            tree, above = start._find(key)
+            if tree is None:
+                path.append(start)
+                results[key] = []
+            else:
+                path.extend(above or [start])
+                if tree is not start:
+                    path.append(tree)
+                results[key] = _top_k(tree, limit)
+            previous = key
+        return [list(results[tuple(prefix)]) for prefix in prefixes]
+
+    def _find(self, prefix: Tuple, stats: Optional[TreeStats] = None
+              ) -> Tuple[Optional[CompressedPrefixTree],
+                         List[CompressedPrefixTree]]:
+        """Return the highest tree whose values all match <prefix>, together
+        with the list of trees above it (starting with this tree).
+
+        Return (None, []) if no value in this tree matches <prefix>. If
+        <stats> is given, the work done is added to it.
+        """
+        if self.is_empty():
+            return None, []
+        path = []
+        tree = self
+        depth = 0
+        while True:
+            end = min(tree._depth, len(prefix))
+            if tree._source[depth:end] != prefix[depth:end]:
+                break
+            if len(prefix) <= tree._depth:
+                if stats is not None:
+                    stats.nodes_visited += len(path) + 1
+                    stats.comparisons += len(prefix)
+                return tree, path
+            child = tree._children.get(prefix[tree._depth])
+            if child is None:
+                break
+            path.append(tree)
+            depth = tree._depth + 1
+            tree = child
+        if stats is not None:
+            stats.nodes_visited += len(path) + 1
+            stats.comparisons += min(depth + 1, len(prefix))
+        return None, []
+
+    def remove(self, prefix: List) -> None:
+        """Remove all values that match the given prefix.
+        """
+        tree, path = self._find(tuple(prefix))
+        if tree is None:
+            return None
+        if not path:
+            self.__init__(self._weight_type)
+            return None
+
+        parent = path[-1]
+        parent.subtrees.discard(tree)
+        del parent._children[tree._source[parent._depth]]
+        child = None
+        for ancestor in reversed(path):
+            old_weight = ancestor.weight
+            ancestor.size -= tree.size
+            ancestor._weight_sum -= tree._weight_sum
+            if ancestor._weight_type == 'average':
+                ancestor.weight = ancestor._weight_sum / ancestor.size
+            else:
+                ancestor.weight = ancestor._weight_sum
+            ancestor._max_weight = max(subtree._max_weight
+                                       for subtree in ancestor.subtrees)
+            if child is not None:
+                ancestor.subtrees.reweigh(child, child_weight)
+            child, child_weight = ancestor, old_weight
+        if len(parent.subtrees) == 1 and parent.subtrees[0].subtrees:
+            parent._merge()
+        return None
+
+
+################################################################################
+# Instrumentation
+################################################################################
+class TreeStats:
+    """Counters of the work done by operations on an Autocompleter.
+
+    The trees in this module only count their work when they are handed a
+    TreeStats, which InstrumentedAutocompleter does on each call. Otherwise
+    the counting code is skipped with a single test per call, so it costs
+    nothing measurable.
+
+    === Attributes ===
+    calls: the number of calls of each operation, by name.
+    seconds: the total time spent in each operation, by name.
+    nodes_visited: the number of trees looked at, while descending along a
+        prefix or while expanding the trees below it.
+    comparisons: the number of prefix elements compared or looked up while
+        descending, plus the subtrees scanned for a leaf on insert.
+    allocations: the number of trees created, plus the number of heap
+        entries created while expanding trees.
+    results: the number of (value, weight) pairs returned.
+    """
+    calls: Dict[str, int]
+    seconds: Dict[str, float]
+    nodes_visited: int
+    comparisons: int
+    allocations: int
+    results: int
+
+    __slots__ = ('calls', 'seconds', 'nodes_visited', 'comparisons',
+                 'allocations', 'results')
+
+    def __init__(self) -> None:
+        """Initialize counters of no work at all."""
+        self.reset()
+
+    def reset(self) -> None:
+        """Set every counter back to zero."""
+        self.calls = {}
+        self.seconds = {}
+        self.nodes_visited = 0
+        self.comparisons = 0
+        self.allocations = 0
+        self.results = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the counters as a dictionary keyed by attribute name."""
+        return {name: (dict(getattr(self, name))
+                       if name in ('calls', 'seconds') else getattr(self, name))
+                for name in self.__slots__}
+
+    def _add(self, operation: str, seconds: float, work: TreeStats) -> None:
+        """Add one call of <operation> taking <seconds>, which did <work>."""
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        self.seconds[operation] = self.seconds.get(operation, 0.0) + seconds
+        self.nodes_visited += work.nodes_visited
+        self.comparisons += work.comparisons
+        self.allocations += work.allocations
+        self.results += work.results
+
+
+class InstrumentedAutocompleter(Autocompleter):
+    """An Autocompleter that counts the work done by another one, and times
+    each of its operations.
+
+    Wrapping a tree is how instrumentation is turned on: the tree itself is
+    unchanged, and goes back to running at full speed once it is no longer
+    used through this class.
+
+    The work of autocomplete and insert is counted by the simple, compact,
+    cached and compressed trees. Other operations, and other Autocompleters,
+    are timed and their results counted.
+
+    >>> tree = InstrumentedAutocompleter(CompressedPrefixTree('sum'))
+    >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+    >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+    >>> tree.autocomplete(['c'], 1)
+    [('cat', 2.0)]
+    >>> tree.stats.calls
+    {'insert': 2, 'autocomplete': 1}
+    >>> tree.stats.results
+    1
+
+    === Attributes ===
+    tree: the Autocompleter doing the work.
+    stats: the counters of every operation so far.
+    callback: a function called after each operation with its name, the
+        seconds it took and a TreeStats of the work it did, or None.
+    """
+    tree: Autocompleter
+    stats: TreeStats
+    callback: Optional[Callable[[str, float, TreeStats], Any]]
+
+    __slots__ = ('tree', 'stats', 'callback')
+
+    def __init__(self, tree: Autocompleter,
+                 callback: Optional[Callable[[str, float, TreeStats], Any]]
+                 = None) -> None:
+        """Initialize an instrumented view of <tree>, reporting each
+        operation to <callback> if it is not None.
+        """
+        self.tree = tree
+        self.stats = TreeStats()
+        self.callback = callback
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return len(self.tree)
+
+    @property
+    def _weight_type(self) -> str:
+        """The weight type of the wrapped tree."""
+        return self.tree._weight_type
+
+    def _record(self, operation: str, start: float, work: TreeStats) -> None:
+        """Record a call of <operation>, started at time <start>, which did
+        <work>.
+        """
+        seconds = time.perf_counter() - start
+        self.stats._add(operation, seconds, work)
+        if self.callback is not None:
+            self.callback(operation, seconds, work)
+
+    def _counted(self) -> bool:
+        """Return whether the wrapped tree counts the work it does."""
+        return isinstance(self.tree, (SimplePrefixTree, CompressedPrefixTree))
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Insert the given value into this Autocompleter.
+
+        See Autocompleter.insert.
+        """
+        self._insert('insert', value, weight, prefix)
+
+    def increment(self, value: Any, delta: float, prefix: List) -> None:
+        """Add <delta> to the weight of <value>.
+
+        See Autocompleter.increment.
+        """
+        self._insert('increment', value, delta, prefix)
+
+    def _insert(self, operation: str, value: Any, weight: float,
+                prefix: List) -> None:
+        """Insert <value> as the operation named <operation>."""
+        work = TreeStats()
+        start = time.perf_counter()
+        tree = self.tree
+        if isinstance(tree, SimplePrefixTree):
+            tree._insert(value, weight, tuple(prefix), 0, work)
+        elif isinstance(tree, CompressedPrefixTree):
+            tree._insert(value, weight, tuple(prefix), work)
+        else:
+            tree.insert(value, weight, prefix)
+        self._record(operation, start, work)
+
+    def autocomplete(self, prefix: List,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        See Autocompleter.autocomplete.
+        """
+        work = TreeStats()
+        start = time.perf_counter()
+        if self._counted():
+            node = self.tree._descend(prefix, work)
+            result = [] if node is None else \
+                self.tree._suggest(node, limit, work)
+        else:
+            result = self.tree.autocomplete(prefix, limit)
+        work.results = len(result)
+        self._record('autocomplete', start, work)
+        return result
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order.
+        """
+        work = TreeStats()
+        start = time.perf_counter()
+        results = self.tree.autocomplete_many(prefixes, limit)
+        work.results = sum(len(result) for result in results)
+        self._record('autocomplete_many', start, work)
+        return results
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        See Autocompleter.autocomplete_fuzzy.
+        """
+        work = TreeStats()
+        start = time.perf_counter()
+        if self._counted():
+            result = _fuzzy_top_k(self.tree, prefix, max_edits, limit, work)
+        else:
+            result = self.tree.autocomplete_fuzzy(prefix, max_edits, limit)
+        work.results = len(result)
+        self._record('autocomplete_fuzzy', start, work)
+        return result
+
+    def remove(self, prefix: List) -> None:
+        """Remove all values that match the given prefix."""
+        start = time.perf_counter()
+        self.tree.remove(prefix)
+        self._record('remove', start, TreeStats())
+
+    def remove_many(self, prefixes: List[List]) -> None:
+        """Remove all values that match any of the given prefixes."""
+        start = time.perf_counter()
+        self.tree.remove_many(prefixes)
+        self._record('remove_many', start, TreeStats())
+
+    def freeze(self) -> FrozenPrefixIndex:
+        """Return a read-only copy of the wrapped tree."""
+        return self.tree.freeze()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by the wrapped tree."""
+        return self.tree.memory_stats()
+
+
+################################################################################
+# VersionedPrefixTree
+################################################################################
+# The attributes of a tree holding containers that its operations modify.
+_CONTAINER_SLOTS = ('subtrees', '_children', '_top')
+
+# The slots of each tree class, filled in by _slots.
+_SLOTS = {}
+
+
+def _slots(cls: type) -> List[Tuple[str, Any]]:
+    """Return the name and descriptor of each slot of <cls> and its
+    superclasses.
+
+    The descriptors are used directly, since a subclass may hide a slot
+    behind a property (as CompactPrefixTree does with value).
+    """
+    slots = _SLOTS.get(cls)
+    if slots is None:
+        slots = [(name, klass.__dict__[name]) for klass in cls.__mro__
+                 for name in klass.__dict__.get('__slots__', ())]
+        _SLOTS[cls] = slots
+    return slots
+
+
+def _copy_node(tree: Any) -> Any:
+    """Return a copy of the tree object <tree>, sharing its subtrees but not
+    the containers its operations modify.
+    """
+    copy = object.__new__(type(tree))
+    for name, slot in _slots(type(tree)):
+        try:
+            value = slot.__get__(tree)
+        except AttributeError:
+            continue
+        if name in _CONTAINER_SLOTS and value is not None:
+            value = value.copy()
+        slot.__set__(copy, value)
+    return copy
+
+
+def _replace_child(parent: Any, child: Any) -> Any:
+    """Replace <child> by a copy of it in the subtrees and child index of
+    <parent>, and return the copy.
+    """
+    copy = _copy_node(child)
+    for i, subtree in enumerate(parent.subtrees):
+        if subtree is child:
+            parent.subtrees[i] = copy
+            break
+    if parent._children:
+        for symbol, subtree in parent._children.items():
+            if subtree is child:
+                parent._children[symbol] = copy
+                break
+    return copy
+
+
+def _copy_path(root: Any, prefix: List, value: Any = None) -> Any:
+    """Return a copy of <root> in which every tree along <prefix>, and the
+    leaf storing <value> at the end of it (if any), is copied as well.
+
+    Inserting <value> with <prefix> into the copy, or removing <prefix> from
+    it, changes none of the trees shared with <root>.
+    """
+    copy = _copy_node(root)
+    tree = copy
+    if isinstance(tree, CompressedPrefixTree):
+        while not tree.is_empty() and tree._depth < len(prefix):
+            child = tree._children.get(prefix[tree._depth])
+            if child is None:
+                return copy
+            tree = _replace_child(tree, child)
+    else:
+        for symbol in prefix[len(tree.value):]:
+            child = tree._child(symbol)
+            if child is None:
+                return copy
+            tree = _replace_child(tree, child)
+    for subtree in tree.subtrees:
+        if not subtree.subtrees and subtree.value == value:
+            _replace_child(tree, subtree)
+            break
+    return copy
+
+
+class VersionedPrefixTree(Autocompleter):
+    """An Autocompleter whose readers never wait for its writers.
+
+    The values are stored in a prefix tree (any of the classes above) that
+    is never changed once it has been published. insert and remove copy the
+    trees along the given prefix, apply the change to the copies, and then
+    publish the new root with a single assignment. Readers use whichever
+    root was published when they started, and so always see a consistent
+    version; the versions share every tree off the changed path.
+
+    Writers are serialized with a lock; readers take no lock.
+
+    >>> tree = VersionedPrefixTree(SimplePrefixTree('sum'))
+    >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+    >>> before = tree.snapshot()
+    >>> tree.insert('car', 3.0, ['c', 'a', 'r'])
+    >>> tree.autocomplete(['c'])
+    [('car', 3.0), ('cat', 2.0)]
+    >>> before.autocomplete(['c'])
+    [('cat', 2.0)]
+
+    === Attributes ===
+    version: the number of changes published so far.
+
+    === Private Attributes ===
+    _root: the current version of the prefix tree.
+    _write_lock: held by a writer while it builds a new version.
+    """
+    version: int
+    _root: Autocompleter
+    _write_lock: threading.Lock
+
+    __slots__ = ('version', '_root', '_write_lock')
+
+    def __init__(self, tree: Autocompleter) -> None:
+        """Initialize a versioned Autocompleter storing the values in <tree>.
+
+        <tree> is a SimplePrefixTree or CompressedPrefixTree (or a subclass
+        of one). It must not be changed by anything else afterwards.
+        """
+        self.version = 0
+        self._root = tree
+        self._write_lock = threading.Lock()
+
+    @property
+    def _weight_type(self) -> str:
+        """The weight type of the prefix tree."""
+        return self._root._weight_type
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return len(self._root)
+
+    def snapshot(self) -> Autocompleter:
+        """Return the current version of the prefix tree.
+
+        The returned tree is never changed by this Autocompleter, and must
+        not be changed by the caller either.
+        """
+        return self._root
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Insert the given value into this Autocompleter.
+
+        See Autocompleter.insert.
+        """
+        with self._write_lock:
+            root = _copy_path(self._root, prefix, value)
+            root.insert(value, weight, prefix)
+            self._publish(root)
+
+    def remove(self, prefix: List) -> None:
+        """Remove all values that match the given prefix.
+
+        Earlier versions returned by snapshot are left unchanged.
+
+        >>> tree = VersionedPrefixTree(CompressedPrefixTree('sum'))
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> before = tree.snapshot()
+        >>> tree.remove(['c', 'a', 't'])
+        >>> tree.autocomplete([])
+        [('dog', 4.0), ('car', 1.0)]
+        >>> before.autocomplete([])
+        [('dog', 4.0), ('cat', 2.0), ('car', 1.0)]
+        >>> len(tree), len(before), before.weight
+        (2, 3, 7.0)
+        >>> tree.remove(['d'])
+        >>> tree.autocomplete([])
+        [('car', 1.0)]
+        >>> before.autocomplete(['d'])
+        [('dog', 4.0)]
+        """
+        with self._write_lock:
+            root = _copy_path(self._root, prefix)
+            root.remove(prefix)
+            self._publish(root)
+
+    def _publish(self, root: Autocompleter) -> None:
+        """Make <root> the current version of the prefix tree."""
+        self._root = root
+        self.version += 1
+
+    def autocomplete(self, prefix: List,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        See Autocompleter.autocomplete.
+        """
+        return self._root.autocomplete(prefix, limit)
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order, all from the same version.
+        """
+        return self._root.autocomplete_many(prefixes, limit)
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        See Autocompleter.autocomplete_fuzzy.
+        """
+        return self._root.autocomplete_fuzzy(prefix, max_edits, limit)
+
+    def freeze(self) -> FrozenPrefixIndex:
+        """Return a read-only copy of the current version."""
+        return self._root.freeze()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by the current version.
+
+        Trees shared with older versions are counted as well.
+        """
+        return self._root.memory_stats()
+
+
+################################################################################
+# FrozenPrefixIndex
+################################################################################
+# The name and array typecode of each array in a FrozenPrefixIndex.
+_FROZEN_ARRAYS = [
+    ('label_start', 'I'),
+    ('labels', 'I'),
+    ('child_start', 'I'),
+    ('node_key', 'I'),
+    ('node_max', 'd'),
+    ('leaf_start', 'I'),
+    ('leaf_weight', 'd')
+]
+
+
+def _internal_below(tree: Any) -> Any:
+    """Return the tree at the bottom of the chain of trees starting at
+    <tree> in which every tree has a single internal subtree.
+    """
+    while len(tree.subtrees) == 1 and tree.subtrees[0].subtrees:
+        tree = tree.subtrees[0]
+    return tree
+
+
+def _flatten(tree: Any) -> Tuple[Dict[str, array], List[Any], List[Any]]:
+    """Return the arrays of a FrozenPrefixIndex storing the values in the
+    prefix tree <tree>, together with its list of values and its list of
+    prefix symbols.
+
+    The arrays are described in the FrozenPrefixIndex docstring.
+    """
+    arrays = {name: array(code) for name, code in _FROZEN_ARRAYS}
+    label_start = arrays['label_start']
+    labels = arrays['labels']
+    child_start = arrays['child_start']
+    node_key = arrays['node_key']
+    node_max = arrays['node_max']
+    leaf_start = arrays['leaf_start']
+    leaf_weight = arrays['leaf_weight']
+    values = []
+    symbol_ids = {}
+
+    # Trees in breadth-first order, with the depth of the tree above each.
+    queue = [(_internal_below(tree), 0)]
+    label_start.append(0)
+    child_start.append(1)
+    node_key.append(0)
+    leaf_start.append(0)
+    for node, depth in queue:
+        prefix = tuple(node.value) if node.subtrees else ()
+        for symbol in prefix[depth:]:
+            labels.append(symbol_ids.setdefault(symbol, len(symbol_ids)))
+        label_start.append(len(labels))
+        node_max.append(node._max_weight if node.subtrees else 0)
+
+        leaves = []
+        children = []
+        for subtree in node.subtrees:
+            if subtree.subtrees:
+                child = _internal_below(subtree)
+                symbol = child.value[len(prefix)]
+                key = symbol_ids.setdefault(symbol, len(symbol_ids))
+                children.append((key, child))
+            elif subtree.weight > 0:
+                leaves.append(subtree)
+        children.sort(key=itemgetter(0))
+        for key, child in children:
+            node_key.append(key)
+            queue.append((child, len(prefix)))
+        child_start.append(child_start[-1] + len(children))
+
+        leaves.sort(key=attrgetter('weight'), reverse=True)
+        for leaf in leaves:
+            leaf_weight.append(leaf.weight)
+            values.append(leaf.value)
+        leaf_start.append(len(values))
+
+    return arrays, values, sorted(symbol_ids, key=symbol_ids.__getitem__)
+
+
+class FrozenPrefixIndex(Autocompleter):
+    """A read-only Autocompleter storing a prefix tree in flat arrays.
+
+    The tree is stored as a radix tree (chains of internal trees with a
+    single internal subtree are merged), numbered in breadth-first order so
+    that the children of each node have consecutive ids. Prefix symbols are
+    interned as integer ids, so the arrays hold only numbers:
+
+        label_start, labels: node i has the edge label
+            labels[label_start[i]:label_start[i + 1]], a list of symbol ids.
+        child_start: node i has the children with ids in
+            range(child_start[i], child_start[i + 1]), sorted by node_key.
+        node_key: the first symbol id of the edge label of node i.
+        node_max: the largest weight of a value below node i.
+        leaf_start: node i stores the values with ids in
+            range(leaf_start[i], leaf_start[i + 1]), in non-increasing order
+            of weight.
+        leaf_weight: the weight of each value.
+
+    Each array is either an array.array or a memoryview of the same type.
+
+    === Attributes ===
+    weight_type: the weight type of the prefix tree this index was built from.
+
+    === Private Attributes ===
+    _size: the number of values stored in this index.
+    _symbols: the id of each prefix symbol.
+    _values: the value with each id.
+    _label_start, _labels, _child_start, _node_key, _node_max, _leaf_start,
+    _leaf_weight: the arrays described above.
+    """
+    weight_type: str
+    _size: int
+    _symbols: Dict[Any, int]
+    _values: List[Any]
+
+    __slots__ = ('weight_type', '_size', '_symbols', '_values',
+                 '_label_start', '_labels', '_child_start', '_node_key',
+                 '_node_max', '_leaf_start', '_leaf_weight')
+
+    def __init__(self, weight_type: str, size: int, arrays: Dict[str, Any],
+                 symbols: List[Any], values: List[Any]) -> None:
+        """Initialize an index with the given arrays, described in the class
+        docstring, storing <size> values in total.
+
+        <symbols> lists the prefix symbols in order of id, and <values> lists
+        the values in order of id.
+        """
+        self.weight_type = weight_type
+        self._size = size
+        self._symbols = {symbol: i for i, symbol in enumerate(symbols)}
+        self._values = values
+        self._label_start = arrays['label_start']
+        self._labels = arrays['labels']
+        self._child_start = arrays['child_start']
+        self._node_key = arrays['node_key']
+        self._node_max = arrays['node_max']
+        self._leaf_start = arrays['leaf_start']
+        self._leaf_weight = arrays['leaf_weight']
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return self._size
+
+    def freeze(self) -> FrozenPrefixIndex:
+        """Return this index, which is already read-only."""
+        return self
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return a description of the memory used by this index.
+
+        See Autocompleter.memory_stats. Each node counts as an internal
+        tree, and each value as a leaf below its node. The bytes are those
+        of each array, of the symbol ids and of the values.
+        """
+        child_start = self._child_start
+        leaf_start = self._leaf_start
+        nodes = len(self._node_key)
+        leaves = len(self._leaf_weight)
+        # Children have larger ids than their parent, so each node's level
+        # is known before its children are reached.
+        levels = [0] * nodes
+        depths = {}
+        fan_out = {}
+        compressible = 0
+        for node in range(nodes if leaves else 0):
+            for child in range(child_start[node], child_start[node + 1]):
+                levels[child] = levels[node] + 1
+            children = child_start[node + 1] - child_start[node]
+            values = leaf_start[node + 1] - leaf_start[node]
+            fan_out[children + values] = fan_out.get(children + values, 0) + 1
+            if values:
+                depths[levels[node] + 1] = \
+                    depths.get(levels[node] + 1, 0) + values
+            elif children == 1:
+                compressible += 1
+
+        components = {name: memoryview(getattr(self, '_' + name)).nbytes
+                      for name, _ in _FROZEN_ARRAYS}
+        components['symbols'] = sys.getsizeof(self._symbols)
+        components['values'] = sys.getsizeof(self._values) + \
+            sum(sys.getsizeof(value) for value in self._values)
+        components['total'] = sum(components.values())
+        trees = nodes + leaves if leaves else 0
+        return {
+            'leaves': leaves,
+            'internal': nodes if leaves else 0,
+            'compressible': compressible,
+            'prefix_elements': len(self._labels),
+            'bytes': components,
+            'depth_histogram': dict(sorted(depths.items())),
+            'fan_out': dict(sorted(fan_out.items())),
+            'compression_ratio':
+                (1 + len(self._labels) + leaves) / trees if trees else 1.0
+        }
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Raise TypeError, since this index is read-only."""
+        raise TypeError(f'{type(self).__name__} is read-only; insert into '
+                        f'the prefix tree it was built from instead')
+
+    def remove(self, prefix: List) -> None:
+        """Raise TypeError, since this index is read-only."""
+        raise TypeError(f'{type(self).__name__} is read-only; remove from '
+                        f'the prefix tree it was built from instead')
+
+    def autocomplete(self, prefix: List,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        ordered in non-increasing weight. (You can decide how to break ties.)
+
+        If limit is None, return *every* match for the given prefix.
+
+        Precondition: limit is None or limit > 0.
+
+        >>> tree = SimplePrefixTree('sum')
+        >>> tree.insert('car', 1.0, ['c', 'a', 'r'])
+        >>> tree.insert('cat', 2.0, ['c', 'a', 't'])
+        >>> tree.insert('dog', 4.0, ['d', 'o', 'g'])
+        >>> index = tree.freeze()
+        >>> index.autocomplete(['c'])
+        [('cat', 2.0), ('car', 1.0)]
+        >>> index.autocomplete([], 2)
+        [('dog', 4.0), ('cat', 2.0)]
+        """
+        node = self._find(prefix)
+        if node is None:
+            return []
+        if limit is None:
+            leaves = self._all_leaves(node)
+        else:
+            leaves = self._top_leaves(node, limit)
+        return [(self._value(leaf), self._leaf_weight[leaf])
+                for leaf in leaves]
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> values with a prefix sequence starting with
+        a sequence within <max_edits> edits of <prefix>.
+
+        See Autocompleter.autocomplete_fuzzy. Nodes are expanded best-first
+        by node_max as in _top_leaves, each carrying the Levenshtein row of
+        its prefix against <prefix>, and dropped once every entry of the row
+        exceeds <max_edits>.
+        """
+        # A symbol not in this index never equals a label, so it can only
+        # be matched by an edit.
+        query = [self._symbols.get(symbol, -1) for symbol in prefix]
+        label_start = self._label_start
+        labels = self._labels
+        child_start = self._child_start
+        leaf_start = self._leaf_start
+        leaf_weight = self._leaf_weight
+        node_max = self._node_max
+        if not len(leaf_weight):
+            return []
+        row = list(range(len(query) + 1))
+        matched = row[-1] <= max_edits
+        if not matched:
+            matched, row = _edit_rows(row, query,
+                                      labels[label_start[0]:label_start[1]],
+                                      max_edits)
+            if not matched and row is None:
+                return []
+
+        leaves = []
+        # Entries (-weight, tiebreak, index, end, row): a node if end is -1,
+        # with its row or None if every value below it matches, and
+        # otherwise the value <index> in a run of values ending before <end>.
+        heap = [(-node_max[0], 0, 0, -1, None if matched else row)]
+        count = 1
+        while heap and (limit is None or len(leaves) < limit):
+            _, _, index, end, row = heapq.heappop(heap)
+            if end >= 0:
+                leaves.append(index)
+                index += 1
+                if index < end:
+                    heapq.heappush(heap, (-leaf_weight[index], count, index,
+                                          end, None))
+                    count += 1
+                continue
+            start, end = leaf_start[index], leaf_start[index + 1]
+            if row is None and start < end:
+                heapq.heappush(heap, (-leaf_weight[start], count, start, end,
+                                      None))
+                count += 1
+            for child in range(child_start[index], child_start[index + 1]):
+                child_row = None
+                if row is not None:
+                    matched, child_row = _edit_rows(
+                        row, query,
+                        labels[label_start[child]:label_start[child + 1]],
+                        max_edits)
+                    if not matched and child_row is None:
+                        continue
+                heapq.heappush(heap, (-node_max[child], count, child, -1,
+                                      child_row))
+                count += 1
+        return [(self._value(leaf), leaf_weight[leaf]) for leaf in leaves]
+
+    def _find(self, prefix: List) -> Optional[int]:
+        """Return the highest node whose values all match <prefix>, or None
+        if no value matches <prefix>.
+        """
+        try:
+            ids = [self._symbols[symbol] for symbol in prefix]
+        except (KeyError, TypeError):
+            return None
+        label_start = self._label_start
+        node = 0
+        depth = 0
+        while True:
+            start = label_start[node]
+            length = min(label_start[node + 1] - start, len(ids) - depth)
+            if self._labels[start:start + length].tolist() != \
+                    ids[depth:depth + length]:
+                return None
+            depth += length
+            if depth == len(ids):
+                return node
+            low = self._child_start[node]
+            high = self._child_start[node + 1]
+            node = bisect_left(self._node_key, ids[depth], low, high)
+            if node == high or self._node_key[node] != ids[depth]:
+                return None
+
+    def _top_leaves(self, node: int, limit: int) -> List[int]:
+        """Return the ids of up to <limit> of the values below <node> with
+        the largest weights, in non-increasing order of weight.
+
+        Nodes are expanded best-first by node_max, and the values stored
+        directly below a node are visited one at a time, since they are
+        already sorted.
+        """
+        child_start = self._child_start
+        leaf_start = self._leaf_start
+        leaf_weight = self._leaf_weight
+        node_max = self._node_max
+        leaves = []
+        # Entries (-weight, tiebreak, index, end): a node if end is -1, and
+        # otherwise the value <index> in a run of values ending before <end>.
+        heap = [(-node_max[node], 0, node, -1)]
+        count = 1
+        while heap and len(leaves) < limit:
+            _, _, index, end = heapq.heappop(heap)
+            if end >= 0:
+                leaves.append(index)
+                index += 1
+                if index < end:
+                    heapq.heappush(heap,
+                                   (-leaf_weight[index], count, index, end))
+                    count += 1
+                continue
+            start, end = leaf_start[index], leaf_start[index + 1]
+            if start < end:
+                heapq.heappush(heap, (-leaf_weight[start], count, start, end))
+                count += 1
+            for child in range(child_start[index], child_start[index + 1]):
+                heapq.heappush(heap, (-node_max[child], count, child, -1))
+                count += 1
+        return leaves
+
+    def _all_leaves(self, node: int) -> List[int]:
+        """Return the ids of every value below <node>, in non-increasing
+        order of weight.
+        """
+        leaves = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            leaves.extend(range(self._leaf_start[node],
+                                self._leaf_start[node + 1]))
+            stack.extend(range(self._child_start[node],
+                               self._child_start[node + 1]))
+        leaves.sort(key=self._leaf_weight.__getitem__, reverse=True)
+        return leaves
+
+    def _value(self, leaf: int) -> Any:
+        """Return the value with id <leaf>."""
+        return self._values[leaf]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,339 @@
+"""CSC148 Assignment 2: Sharded autocomplete engine
+
+=== CSC148 Fall 2018 ===
+Department of Computer Science,
+University of Toronto
+
+=== Module Description ===
+This file contains a wrapper around the autocomplete engines in
+autocomplete_engines.py that spreads one engine over several worker processes.
+
+Each worker builds an engine storing only the values whose prefix sequence
+starts with an element assigned to it, and each query or removal is sent to
+the one worker that owns its first element. Only an empty prefix involves
+every worker.
+
+The shards are built in parallel. The input file is split into one byte range
+per worker, at line breaks, and each worker reads and aggregates only its own
+range. The workers then exchange the values they read that belong to other
+shards, through the parent process, and each one builds its shard from what it
+read and received. Reading the file, which dominates the build, is therefore
+split evenly, whatever the distribution of the values over the shards.
+"""
+from __future__ import annotations
+import heapq
+import os
+import time
+from itertools import islice
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from autocomplete_engines import _AutocompleteEngine, _partition, _shard_of
+
+
+def _split_points(path: str, count: int) -> List[int]:
+    """Return the offsets splitting the file at <path> into <count> byte
+    ranges of about the same size, each starting at the start of a line.
+
+    Range i is range(points[i], points[i + 1]); some ranges may be empty.
+    """
+    size = os.path.getsize(path)
+    points = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, count):
+            offset = size * i // count
+            if offset > points[-1]:
+                # The next line starts after the line break at or after
+                # offset - 1.
+                f.seek(offset - 1)
+                f.readline()
+                offset = f.tell()
+            points.append(max(offset, points[-1]))
+    points.append(size)
+    return points
+
+
+def _serve_shard(conn: Connection, engine_class: Type[_AutocompleteEngine],
+                 config: Dict[str, Any], index: int, count: int,
+                 part: Tuple[int, int]) -> None:
+    """Build shard number <index> of <count> of an engine of <engine_class>
+    with the given configuration, and answer the calls sent over <conn>
+    until None is received.
+
+    The values in the byte range <part> of config['file'] are read and
+    aggregated first. Those owned by other shards are sent to the parent as
+    a list with a dict of values for each shard (None for this one), and
+    the parent replies with the list of dicts the other workers read for
+    this shard. Once the engine is built, its load statistics are sent.
+
+    Each call is then a pair (method name, arguments), and is answered with
+    (True, result) or (False, exception raised).
+    """
+    start = time.perf_counter()
+    totals, lines = engine_class._read(config, part)
+    parts = _partition(totals, engine_class._value_sequence, count)
+    del totals
+    totals = parts[index]
+    parts[index] = None
+    conn.send(parts)
+    del parts
+    for received in conn.recv():
+        for value, weight in received.items():
+            totals[value] = totals.get(value, 0) + weight
+    engine = engine_class._from_totals(config, totals, lines, start)
+    del totals
+    conn.send(engine.load_stats())
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        name, args = message
+        try:
+            result = getattr(engine, name)(*args)
+        except Exception as error:
+            conn.send((False, error))
+        else:
+            conn.send((True, result))
+    conn.close()
+
+
+def _merge(results: List[List[Tuple[Any, float]]],
+           limit: Optional[int]) -> List[Tuple[Any, float]]:
+    """Return up to <limit> of the (value, weight) pairs in <results>, lists
+    in non-increasing order of weight, in non-increasing order of weight.
+    """
+    merged = heapq.merge(*results, key=itemgetter(1), reverse=True)
+    return list(islice(merged, limit))
+
+
+class ShardedAutocompleteEngine:
+    """An autocomplete engine split across several worker processes.
+
+    The prefixes given to this engine are those of the wrapped engine class:
+    strings for LetterAutocompleteEngine and SentenceAutocompleteEngine, and
+    interval sequences for MelodyAutocompleteEngine.
+
+    A ShardedAutocompleteEngine must not be used by several threads at once.
+    Call close (or use it in a with statement) to stop its workers.
+
+    === Attributes ===
+    engine_class: the class of the engine in each worker.
+    workers: the number of worker processes.
+
+    === Private Attributes ===
+    _connections: the connection to each worker, in shard order.
+    _processes: the worker processes, in shard order.
+    _load_stats: statistics on building the shards.
+    """
+    engine_class: Type[_AutocompleteEngine]
+    workers: int
+    _connections: List[Connection]
+    _processes: List[Process]
+    _load_stats: Dict[str, float]
+
+    def __init__(self, engine_class: Type[_AutocompleteEngine],
+                 config: Dict[str, Any],
+                 workers: Optional[int] = None) -> None:
+        """Start <workers> processes (by default, one per CPU), each building
+        one shard of an engine of <engine_class> with the given
+        configuration, and wait until they are all built.
+
+        The file is split between the workers at line breaks, so a CSV
+        file must not have a quoted field containing a line break.
+
+        Precondition: workers is None or workers > 0.
+        """
+        start = time.perf_counter()
+        self.engine_class = engine_class
+        self.workers = workers or os.cpu_count() or 1
+        self._connections = []
+        self._processes = []
+        points = _split_points(config['file'], self.workers)
+        for index in range(self.workers):
+            parent, child = Pipe()
+            process = Process(target=_serve_shard, daemon=True,
+                              args=(child, engine_class, config, index,
+                                    self.workers,
+                                    (points[index], points[index + 1])))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+        # Pass on the values each worker read for the other shards, dropping
+        # them here as soon as they are sent.
+        outgoing = [conn.recv() for conn in self._connections]
+        for index, conn in enumerate(self._connections):
+            incoming = []
+            for parts in outgoing:
+                if parts[index] is not None:
+                    incoming.append(parts[index])
+                    parts[index] = None
+            conn.send(incoming)
+        del outgoing, incoming
+
+        shard_stats = [conn.recv() for conn in self._connections]
+        seconds = time.perf_counter() - start
+        lines = sum(stats['lines'] for stats in shard_stats)
+        self._load_stats = {
+            'lines': lines,
+            'distinct': sum(stats['distinct'] for stats in shard_stats),
+            'seconds': seconds,
+            'lines_per_second': lines / seconds if seconds > 0 else 0.0
+        }
+
+    def __enter__(self) -> ShardedAutocompleteEngine:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the worker processes of this engine."""
+        for conn in self._connections:
+            conn.send(None)
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def load_stats(self) -> Dict[str, float]:
+        """Return statistics on building the shards of this engine.
+
+        The keys are those of the wrapped engine's load_stats. 'seconds' is
+        the time until every shard was built, and 'distinct' is the total
+        over all shards.
+        """
+        return dict(self._load_stats)
+
+    def memory_stats(self) -> List[Dict[str, Any]]:
+        """Return the memory_stats of the engine of each shard, in order."""
+        return self._call(list(range(self.workers)), 'memory_stats')
+
+    def _shards(self, prefix: Any) -> List[int]:
+        """Return the shards holding the values that match <prefix>."""
+        sequence = self.engine_class._sequence(prefix)
+        if sequence:
+            return [_shard_of(sequence, self.workers)]
+        return list(range(self.workers))
+
+    def _call(self, shards: List[int], name: str, *args: Any) -> List[Any]:
+        """Call the method <name> with <args> on the engine of each of the
+        given shards in parallel, and return their results in the same order.
+        """
+        for shard in shards:
+            self._connections[shard].send((name, args))
+        replies = [self._connections[shard].recv() for shard in shards]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def autocomplete(self, prefix: Any,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        See the autocomplete method of the wrapped engine class.
+        """
+        return _merge(self._call(self._shards(prefix), 'autocomplete',
+                                 prefix, limit), limit)
+
+    def autocomplete_approximate(self, prefix: List[int], tolerance: int = 1,
+                                 limit: Optional[int] = None
+                                 ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> melodies whose leading intervals are each
+        within <tolerance> semitones of those of <prefix>.
+
+        See MelodyAutocompleteEngine.autocomplete_approximate. Matches may
+        start with any interval near the first one of <prefix>, so every
+        shard is searched.
+        """
+        return _merge(self._call(list(range(self.workers)),
+                                 'autocomplete_approximate',
+                                 prefix, tolerance, limit), limit)
+
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int = 1,
+                           limit: Optional[int] = None
+                           ) -> List[Tuple[Any, float]]:
+        """Return up to <limit> strings starting with a string within
+        <max_edits> typos of the given prefix string.
+
+        See LetterAutocompleteEngine.autocomplete_fuzzy. The first letter of
+        <prefix> may be a typo, so every shard is searched.
+        """
+        return _merge(self._call(list(range(self.workers)),
+                                 'autocomplete_fuzzy',
+                                 prefix, max_edits, limit), limit)
+
+    def autocomplete_many(self, prefixes: List[Any],
+                          limit: Optional[int] = None
+                          ) -> List[List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for each prefix
+        in <prefixes>, in the same order.
+
+        Each shard answers its share of <prefixes> as one batch, and all of
+        the shards work at the same time. If any shard raises an error, it is
+        raised here once every shard has replied, and later calls are not
+        affected.
+
+        >>> import os, tempfile
+        >>> from autocomplete_engines import LetterAutocompleteEngine
+        >>> path = os.path.join(tempfile.mkdtemp(), 'words.txt')
+        >>> with open(path, 'w') as f:
+        ...     for word in ['ab', 'abc', 'abc', 'cd', 'ef']:
+        ...         print(word, file=f)
+        >>> config = {'file': path, 'autocompleter': 'simple',
+        ...           'weight_type': 'sum'}
+        >>> engine = ShardedAutocompleteEngine(LetterAutocompleteEngine,
+        ...                                    config, 3)
+        >>> engine.autocomplete_many(['ab', 'cd', 'ef'], 'x')
+        Traceback (most recent call last):
+        TypeError: '<' not supported between instances of 'int' and 'str'
+        >>> engine.autocomplete_many(['ab', 'cd', 'ef'], 1)
+        [[('abc', 2)], [('cd', 1)], [('ef', 1)]]
+        >>> engine.close()
+        >>> os.remove(path)
+        >>> os.rmdir(os.path.dirname(path))
+        """
+        batches = [[] for _ in range(self.workers)]
+        for i, prefix in enumerate(prefixes):
+            for shard in self._shards(prefix):
+                batches[shard].append(i)
+        shards = [shard for shard in range(self.workers) if batches[shard]]
+        for shard in shards:
+            self._connections[shard].send(
+                ('autocomplete_many',
+                 ([prefixes[i] for i in batches[shard]], limit)))
+
+        # Every reply is read before any error is raised, so that none is
+        # left behind to be mistaken for the reply to a later call.
+        replies = [self._connections[shard].recv() for shard in shards]
+        for ok, results in replies:
+            if not ok:
+                raise results
+        parts = [[] for _ in prefixes]
+        for shard, (_, results) in zip(shards, replies):
+            for i, result in zip(batches[shard], results):
+                parts[i].append(result)
+        return [part[0] if len(part) == 1 else _merge(part, limit)
+                for part in parts]
+
+    def remove(self, prefix: Any) -> None:
+        """Remove all values that match the given prefix.
+
+        See the remove method of the wrapped engine class.
+        """
+        self._call(self._shards(prefix), 'remove', prefix)
+
+    def increment(self, value: Any, delta: float = 1) -> None:
+        """Add <delta> to the weight of <value>, inserting it if it is not
+        stored yet.
+
+        See the increment method of the wrapped engine class.
+        """
+        shard = _shard_of(self.engine_class._value_sequence(value),
+                          self.workers)
+        self._call([shard], 'increment', value, delta)
@@ -0,0 +1,368 @@
+"""CSC148 Assignment 2: Suggestion server
+
+=== CSC148 Fall 2018 ===
+Department of Computer Science,
+University of Toronto
+
+=== Module Description ===
+This file contains a small asyncio HTTP server answering autocomplete and
+remove requests against one of the engines in autocomplete_engines.py (or a
+ShardedAutocompleteEngine). It is meant to listen on the loopback interface.
+
+    GET  /autocomplete?prefix=<prefix>&limit=<limit>
+        {"prefix": ..., "results": [[value, weight], ...]}
+    POST /remove?prefix=<prefix>    (GET is accepted too)
+        {"removed": ...}
+    GET  /stats
+        the counters described in SuggestionServer.stats
+
+Queries are not answered one at a time. A query waits up to batch_window
+seconds for others to arrive. The burst is then looked up in the engine's
+query cache, and the misses are answered with one call to the engine's
+autocomplete_many per limit. A query identical to one that is still waiting
+shares its answer instead of being looked up again.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from autocomplete_engines import _SANITIZE
+
+
+# The number of recent request latencies kept for the percentiles.
+_LATENCY_WINDOW = 100000
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    409: 'Conflict',
+    500: 'Internal Server Error'
+}
+
+
+def _sanitize(prefix: str) -> str:
+    """Return <prefix> sanitized like the strings in the text engines."""
+    return prefix.lower().translate(_SANITIZE)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile <fraction> of <ordered>, a
+    non-empty list in non-decreasing order.
+    """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _jsonable(value: Any) -> Any:
+    """Return a JSON representation of a value stored by an engine."""
+    if isinstance(value, (str, int, float)):
+        return value
+    return getattr(value, 'name', repr(value))
+
+
+class SuggestionServer:
+    """An HTTP front end for an autocomplete engine.
+
+    === Attributes ===
+    engine: the engine answering the requests.
+    host: the interface this server listens on.
+    port: the port this server listens on (chosen by the system if 0 was
+        given, once the server is started).
+    batch_window: the number of seconds a query waits for others to batch.
+    max_batch: the number of waiting queries that triggers a batch at once.
+
+    === Private Attributes ===
+    _parse_prefix: turns the prefix parameter into a prefix for the engine.
+    _server: the running asyncio server, or None if it is not started.
+    _waiting: the shared answer of each waiting query, keyed by its prefix
+        and limit.
+    _flush_handle: the scheduled call answering the waiting queries, or None.
+    _started: the time the server started.
+    _requests, _queries, _coalesced, _batches, _batched:
+        the counters reported by stats.
+    _latencies: the latencies of recent requests, in seconds.
+    """
+    engine: Any
+    host: str
+    port: int
+    batch_window: float
+    max_batch: int
+    _parse_prefix: Callable[[str], Any]
+    _server: Optional[asyncio.AbstractServer]
+    _waiting: Dict[Tuple[Any, Optional[int]], Tuple[Any, asyncio.Future]]
+    _flush_handle: Optional[asyncio.TimerHandle]
+    _started: float
+    _requests: int
+    _queries: int
+    _coalesced: int
+    _batches: int
+    _batched: int
+    _latencies: Deque[float]
+
+    def __init__(self, engine: Any, host: str = '127.0.0.1', port: int = 0,
+                 batch_window: float = 0.002, max_batch: int = 128,
+                 parse_prefix: Callable[[str], Any] = _sanitize) -> None:
+        """Initialize a server for <engine>, which is started by start.
+
+        <parse_prefix> turns the prefix parameter of a request into a prefix
+        for the engine. The default suits the text engines; for a
+        MelodyAutocompleteEngine, pass a function that parses a list of
+        intervals.
+        """
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._parse_prefix = parse_prefix
+        self._server = None
+        self._waiting = {}
+        self._flush_handle = None
+        self._started = time.perf_counter()
+        self._requests = 0
+        self._queries = 0
+        self._coalesced = 0
+        self._batches = 0
+        self._batched = 0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+    async def start(self) -> None:
+        """Start listening for connections."""
+        self._server = await asyncio.start_server(self._handle, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.perf_counter()
+
+    async def close(self) -> None:
+        """Stop listening, and wait for the listening socket to close."""
+        self._flush()
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def serve_forever(self) -> None:
+        """Start listening if necessary, and serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters of this server.
+
+        The keys are 'requests' (HTTP requests answered), 'seconds' (since
+        the server started), 'requests_per_second', 'queries' (autocomplete
+        requests), 'coalesced' (queries answered by an identical waiting
+        query), 'batches' (calls to the engine), 'mean_batch' (queries per
+        call) and 'latency_ms', the 50th, 90th, 99th percentile and maximum
+        latency of recent requests in milliseconds.
+        """
+        seconds = time.perf_counter() - self._started
+        ordered = sorted(self._latencies)
+        if ordered:
+            latency = {name: _percentile(ordered, fraction) * 1000
+                       for name, fraction in [('p50', 0.5), ('p90', 0.9),
+                                              ('p99', 0.99)]}
+            latency['max'] = ordered[-1] * 1000
+        else:
+            latency = {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        return {
+            'requests': self._requests,
+            'seconds': seconds,
+            'requests_per_second': self._requests / seconds,
+            'queries': self._queries,
+            'coalesced': self._coalesced,
+            'batches': self._batches,
+            'mean_batch': self._batched / self._batches
+            if self._batches else 0.0,
+            'latency_ms': latency
+        }
+
+    async def autocomplete(self, prefix: Any,
+                           limit: Optional[int]) -> List[Tuple[Any, float]]:
+        """Return the engine's autocomplete(prefix, limit), answered together
+        with the other queries arriving within batch_window seconds.
+        """
+        self._queries += 1
+        key = (prefix if isinstance(prefix, str) else tuple(prefix), limit)
+        entry = self._waiting.get(key)
+        if entry is not None:
+            self._coalesced += 1
+            future = entry[1]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[key] = (prefix, future)
+            if len(self._waiting) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    self.batch_window, self._flush)
+        # Shield the shared answer, so that a client going away does not
+        # cancel it for the other queries waiting on it.
+        return await asyncio.shield(future)
+
+    def remove(self, prefix: Any) -> None:
+        """Answer the waiting queries, then remove every value matching
+        <prefix> from the engine.
+        """
+        self._flush()
+        self.engine.remove(prefix)
+
+    def _flush(self) -> None:
+        """Answer every waiting query, with one engine call per limit.
+
+        If the engine has a query cache, each query is looked up in it
+        first, and only the misses are sent to the engine. Their results are
+        then cached as the engine's autocomplete would cache them.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        waiting = self._waiting
+        self._waiting = {}
+        cache = getattr(self.engine, '_query_cache', None)
+        by_limit = {}
+        for (_, limit), (prefix, future) in waiting.items():
+            by_limit.setdefault(limit, []).append((prefix, future))
+        for limit, queries in by_limit.items():
+            if cache is None:
+                misses = [(prefix, future, None) for prefix, future in queries]
+            else:
+                # Read before the batch, so that results computed before a
+                # concurrent removal are not cached as current.
+                generation = cache.generation
+                misses = []
+                for prefix, future in queries:
+                    key = tuple(self.engine._sequence(prefix))
+                    result = cache.get(key, limit)
+                    if result is None:
+                        misses.append((prefix, future, key))
+                    else:
+                        future.set_result(result)
+                if not misses:
+                    continue
+            self._batches += 1
+            self._batched += len(misses)
+            try:
+                if len(misses) == 1 and cache is None:
+                    results = [self.engine.autocomplete(misses[0][0], limit)]
+                else:
+                    results = self.engine.autocomplete_many(
+                        [prefix for prefix, _, _ in misses], limit)
+            except Exception as error:
+                for _, future, _ in misses:
+                    future.set_exception(error)
+            else:
+                for (_, future, key), result in zip(misses, results):
+                    if cache is not None:
+                        cache.put(key, limit, result, generation)
+                    future.set_result(result)
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        """Answer the HTTP requests on one connection until it is closed."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                parts = line.decode('latin1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                body = await reader.readexactly(length) if length > 0 else b''
+
+                if len(parts) != 3:
+                    status, payload = 400, {'error': 'malformed request'}
+                elif length < 0:
+                    status, payload = 400, {'error': 'invalid Content-Length'}
+                else:
+                    status, payload = await self._dispatch(parts[0], parts[1],
+                                                           body)
+                # Without a valid Content-Length, the end of the body is not
+                # known, so the connection cannot carry another request.
+                keep_alive = len(parts) == 3 and parts[2] == 'HTTP/1.1' and \
+                    length >= 0 and \
+                    headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload).encode('utf8')
+                writer.write(
+                    f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}'
+                    f'\r\n\r\n'.encode('latin1') + data)
+                await writer.drain()
+                self._requests += 1
+                self._latencies.append(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str,
+                        body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Return the status and JSON payload of the response to a request
+        for <target> with the given method and body.
+        """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if method == 'POST':
+            try:
+                params.update(parse_qs(body.decode('utf8')))
+            except UnicodeDecodeError:
+                return 400, {'error': 'body is not UTF-8'}
+        if url.path == '/stats':
+            return 200, self.stats()
+        if url.path not in ('/autocomplete', '/remove'):
+            return 404, {'error': f'no such path: {url.path}'}
+        if 'prefix' not in params:
+            return 400, {'error': 'missing prefix'}
+        try:
+            prefix = self._parse_prefix(params['prefix'][0])
+            limit = int(params['limit'][0]) if 'limit' in params else None
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        if limit is not None and limit <= 0:
+            return 400, {'error': 'limit must be positive'}
+
+        try:
+            if url.path == '/remove':
+                try:
+                    self.remove(prefix)
+                except TypeError as error:
+                    # Raised by read-only engines, which cannot remove values.
+                    return 409, {'error': str(error)}
+                return 200, {'removed': params['prefix'][0]}
+            results = await self.autocomplete(prefix, limit)
+        except Exception as error:
+            return 500, {'error': str(error)}
+        return 200, {'prefix': params['prefix'][0],
+                     'results': [[_jsonable(value), weight]
+                                 for value, weight in results]}
+
+
+def serve(engine: Any, host: str = '127.0.0.1', port: int = 8000,
+          **options: Any) -> None:
+    """Serve <engine> on the given host and port until interrupted.
+
+    <options> are passed on to SuggestionServer.
+    """
+    server = SuggestionServer(engine, host, port, **options)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass